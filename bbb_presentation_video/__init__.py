@@ -3,6 +3,7 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import argparse
+import logging
 import sys
 from fractions import Fraction
 from importlib.metadata import PackageNotFoundError, metadata
@@ -12,7 +13,13 @@ from typing import IO, Any, cast
 __all__ = ["events", "renderer"]
 
 from bbb_presentation_video.events import DEFAULT_PRESENTATION_POD, parse_events
-from bbb_presentation_video.renderer import Codec, Renderer
+from bbb_presentation_video.renderer import (
+    H264_HW_ENCODERS,
+    Codec,
+    Renderer,
+    find_hw_encoder,
+    render_parallel,
+)
 
 DEFAULT_WIDTH = 960
 DEFAULT_HEIGHT = 720
@@ -68,6 +75,11 @@ def main() -> None:
         help="output file video codec (default: %(default)s)",
         default="vp9",
     )
+    parser.add_argument(
+        "--hwaccel",
+        action="store_true",
+        help="use a hardware h264 encoder if one is available (lossy)",
+    )
     parser.add_argument(
         "-r",
         "--framerate",
@@ -106,6 +118,14 @@ def main() -> None:
         type=Fraction,
         help="generate video for recording section ending at SECONDS",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        metavar="JOBS",
+        type=int,
+        help="number of video sections to render in parallel (default: %(default)s)",
+        default=1,
+    )
     parser.add_argument(
         "-p",
         "--pod",
@@ -114,9 +134,21 @@ def main() -> None:
         help="generate video for a specific pod instead of default pod",
         default=DEFAULT_PRESENTATION_POD,
     )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="print debugging information for every event and frame",
+    )
 
     args = parser.parse_args()
 
+    logging.basicConfig(
+        stream=sys.stdout,
+        format="%(message)s",
+        level=logging.DEBUG if args.verbose else logging.INFO,
+    )
+
     try:
         bpv_metadata = metadata(__package__)
         print(f'{bpv_metadata["Name"]} version {bpv_metadata["Version"]}')
@@ -131,6 +163,17 @@ def main() -> None:
     )
     print(f'Outputting video to "{args.output}"')
 
+    hw_encoder = None
+    if args.hwaccel:
+        if args.codec is Codec.H264:
+            hw_encoder = find_hw_encoder(H264_HW_ENCODERS)
+            if hw_encoder is not None:
+                print(f"Using hardware encoder {hw_encoder.name}")
+            else:
+                print("No working hardware encoder found, using software encoder")
+        else:
+            print(f"Hardware encoding is not supported for codec {args.codec.value}")
+
     print("Parsing events XML...")
     events = parse_events(args.input)
     if events.length is None:
@@ -148,20 +191,38 @@ def main() -> None:
         print(f"Recording section ending at {args.end} seconds")
 
     print("Rendering output video...")
-    renderer = Renderer(
-        events,
-        args.input,
-        args.output,
-        args.width,
-        args.height,
-        args.framerate,
-        args.codec,
-        args.start,
-        args.end,
-        args.pod,
-    )
-
-    renderer.render()
+    if args.jobs > 1:
+        print(f"Rendering in {args.jobs} parallel sections")
+        render_parallel(
+            args.jobs,
+            events,
+            args.input,
+            args.output,
+            args.width,
+            args.height,
+            args.framerate,
+            args.codec,
+            args.start,
+            args.end,
+            args.pod,
+            hw_encoder,
+        )
+    else:
+        renderer = Renderer(
+            events,
+            args.input,
+            args.output,
+            args.width,
+            args.height,
+            args.framerate,
+            args.codec,
+            args.start,
+            args.end,
+            args.pod,
+            hw_encoder,
+        )
+
+        renderer.render()
 
 
 if __name__ == "__main__":
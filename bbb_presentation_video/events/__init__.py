@@ -247,16 +247,8 @@ def parse_shape(
 
     # The 'dataPoints' element contains a list of alternating X and Y
     # coordinates. Collapse them into a collection of Positions
-    points = []
-    points_iter = iter(data_points.split(","))
-    while True:
-        try:
-            points.append(
-                Position(float(next(points_iter)) / 100, float(next(points_iter)) / 100)
-            )
-        except StopIteration:
-            break
-    event["points"] = points
+    coords = [float(c) / 100 for c in data_points.split(",")]
+    event["points"] = [Position(x, y) for x, y in zip(coords[0::2], coords[1::2])]
 
     if shape_type in ["pencil", "rectangle", "ellipse", "triangle", "line"]:
         # These shapes share a bunch of attributes
@@ -2,25 +2,52 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import fcntl
+import logging
+import sys
 import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 from fractions import Fraction
-from queue import Queue
-from subprocess import PIPE, CalledProcessError, Popen
-from typing import Optional, cast
-
+from math import ceil
+from os import path, write
+from queue import SimpleQueue
+from subprocess import DEVNULL, PIPE, CalledProcessError, Popen, run
+from tempfile import TemporaryDirectory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union, cast
+
+import attr
 import cairo
 
-from bbb_presentation_video import events
 from bbb_presentation_video.events import EventsInfo, PerPodEvent, RecordEvent
-from bbb_presentation_video.events.helpers import Color, Size
+from bbb_presentation_video.events.helpers import Size
 from bbb_presentation_video.renderer.cursor import CursorRenderer
 from bbb_presentation_video.renderer.presentation import PresentationRenderer
 from bbb_presentation_video.renderer.tldraw import TldrawRenderer
 from bbb_presentation_video.renderer.whiteboard import ShapesRenderer
 
-DRAWING_BG = Color.from_int(0xE2E8ED)
+log = logging.getLogger(__name__)
+
+# Cairo's RGB24 format stores each pixel as a native-endian 32-bit integer with
+# the top byte unused. The frames are passed to ffmpeg as-is, since ffmpeg's
+# pixel format conversion reads the padded format directly; repacking to
+# 24-bit pixels in Python would cost more than the pipe bandwidth it saves.
+CAIRO_RGB24_PIX_FMT = "bgr0" if sys.byteorder == "little" else "0rgb"
+
+# Size to request for the pipe to ffmpeg. The default of 64KiB takes dozens of
+# writes for a single frame; 1MiB is the default limit for unprivileged users.
+FFMPEG_PIPE_SIZE = 1 << 20
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+
+# Number of frames that ffmpeg can queue between reading its input and encoding.
+# Raw frames are large, so this is kept well below values used for live capture.
+FFMPEG_THREAD_QUEUE_SIZE = 32
+
+# Number of frame buffers shared between the renderer and the encoder thread.
+# One is held by the encoder for repeated frames, the others allow the renderer
+# to keep compositing while frames are being written to ffmpeg.
+ENCODER_BUFFERS = 4
 
 
 class Codec(Enum):
@@ -28,33 +55,149 @@ class Codec(Enum):
     VP9 = "vp9"
 
 
+@attr.s(order=False, slots=True, auto_attribs=True, frozen=True)
+class HardwareEncoder:
+    name: str
+    """Name of the ffmpeg encoder."""
+    global_opts: List[str]
+    """ffmpeg options needed before the input, e.g. to open the device."""
+    filters: str
+    """Filters to convert the frames to a format accepted by the encoder."""
+    codec_opts: List[str]
+    """Encoder options. Hardware encoders can't do lossless, so these are lossy."""
+
+
+H264_HW_ENCODERS = [
+    HardwareEncoder(
+        name="h264_nvenc",
+        global_opts=[],
+        filters="format=yuv420p",
+        codec_opts=[
+            "-c:v",
+            "h264_nvenc",
+            "-preset",
+            "llhp",
+            "-rc",
+            "constqp",
+            "-qp",
+            "20",
+        ],
+    ),
+    HardwareEncoder(
+        name="h264_vaapi",
+        global_opts=["-vaapi_device", "/dev/dri/renderD128"],
+        filters="format=nv12,hwupload",
+        codec_opts=["-c:v", "h264_vaapi", "-qp", "20"],
+    ),
+    HardwareEncoder(
+        name="h264_qsv",
+        global_opts=[],
+        filters="format=nv12",
+        codec_opts=["-c:v", "h264_qsv", "-global_quality", "20"],
+    ),
+]
+
+
+def find_hw_encoder(encoders: Sequence[HardwareEncoder]) -> Optional[HardwareEncoder]:
+    """Find the first hardware encoder that works on this system.
+
+    ffmpeg lists encoders that it was built with even if the hardware or drivers
+    are missing, so each candidate is checked by encoding a test frame.
+    """
+    for encoder in encoders:
+        probe_cmdline = [
+            "ffmpeg",
+            "-hide_banner",
+            "-v",
+            "error",
+            *encoder.global_opts,
+            "-f",
+            "lavfi",
+            "-i",
+            "color=size=256x256",
+            "-frames:v",
+            "1",
+            "-vf",
+            encoder.filters,
+            *encoder.codec_opts,
+            "-f",
+            "null",
+            "-",
+        ]
+        try:
+            probe = run(
+                probe_cmdline,
+                stdin=DEVNULL,
+                stdout=DEVNULL,
+                stderr=PIPE,
+                universal_newlines=True,
+            )
+        except OSError as e:
+            log.debug("Could not run ffmpeg to probe hardware encoders: %s", e)
+            return None
+        if probe.returncode == 0:
+            return encoder
+        log.debug(
+            "Hardware encoder %s is not usable (ffmpeg exited with %d): %s",
+            encoder.name,
+            probe.returncode,
+            probe.stderr.strip(),
+        )
+    return None
+
+
+class EncoderCommand(Enum):
+    REPEAT = "repeat"
+    """Write the previous frame again instead of a new frame."""
+
+
 class Encoder:
-    queue: "Queue[Optional[bytearray]]"
-    ret_queue: "Queue[bytearray]"
+    queue: "SimpleQueue[Optional[Union[bytearray, EncoderCommand]]]"
+    ret_queue: "SimpleQueue[bytearray]"
 
     def __init__(
-        self, output: str, width: int, height: int, framerate: Fraction, codec: Codec
+        self,
+        output: str,
+        width: int,
+        height: int,
+        framerate: Fraction,
+        codec: Codec,
+        hw_encoder: Optional[HardwareEncoder] = None,
     ):
         self.output = output
         self.width = width
         self.height = height
         self.framerate = framerate
         self.codec = codec
+        self.hw_encoder = hw_encoder
 
-        self.queue = Queue()
-        self.ret_queue = Queue()
-        for x in range(0, 3):
+        self.queue = SimpleQueue()
+        self.ret_queue = SimpleQueue()
+        for x in range(0, ENCODER_BUFFERS):
             self.ret_queue.put(bytearray(width * height * 4))
 
         self.thread = threading.Thread(target=self.run)
         self.thread.daemon = True
         self.thread.start()
 
-    def put(self, data: bytes) -> None:
+    def put(self, data: memoryview) -> None:
+        """Copy a frame into a pooled buffer and queue it for output.
+
+        The data can be a view of the cairo surface; it is copied before this
+        returns, so the surface can be drawn on again immediately.
+        """
         buf = self.ret_queue.get()
         buf[:] = data
         self.queue.put(buf)
 
+    def repeat_last(self) -> None:
+        """Output the previous frame again.
+
+        The previous frame's buffer is held by the writing thread, so this avoids
+        copying the (unchanged) surface data again.
+        """
+        self.queue.put(EncoderCommand.REPEAT)
+
     def join(self) -> None:
         # This is a sentinal value to tell the writing thread to exit
         self.queue.put(None)
@@ -76,29 +219,37 @@ class Encoder:
                 "-row-mt",
                 "1",
             ]
+        global_opts: List[str] = []
+        filters = [f"mpdecimate=max={int(round(self.framerate)):d}:hi=1:lo=1:frac=1"]
+        pix_fmt_opts = ["-pix_fmt", "yuv420p"]
+        if self.hw_encoder is not None:
+            global_opts = self.hw_encoder.global_opts
+            filters.append(self.hw_encoder.filters)
+            pix_fmt_opts = []
+            codec_opts = self.hw_encoder.codec_opts
         # Launch the video encoder
-        # Note that the hardcoded 'bgr0' here is only applicable in
-        # little-endian!
         ffmpeg_cmdline = [
             "ffmpeg",
             "-y",
             "-nostats",
             "-v",
             "warning",
+            *global_opts,
+            "-thread_queue_size",
+            str(FFMPEG_THREAD_QUEUE_SIZE),
             "-f",
             "rawvideo",
             "-pixel_format",
-            "bgr0",
+            CAIRO_RGB24_PIX_FMT,
             "-video_size",
             f"{self.width:d}x{self.height:d}",
             "-framerate",
             str(self.framerate),
             "-i",
             "-",
-            "-pix_fmt",
-            "yuv420p",
+            *pix_fmt_opts,
             "-vf",
-            f"mpdecimate=max={int(round(self.framerate)):d}:hi=1:lo=1:frac=1",
+            ",".join(filters),
             *codec_opts,
             "-threads",
             "2",
@@ -109,18 +260,51 @@ class Encoder:
             self.output,
         ]
 
-        ffmpeg = Popen(ffmpeg_cmdline, stdin=PIPE, stdout=PIPE, close_fds=True)
-        assert ffmpeg.stdout is not None and ffmpeg.stdin is not None
-        ffmpeg.stdout.close()
-
+        # The input pipe is unbuffered; frames are written directly to the file
+        # descriptor to avoid copying them through a BufferedWriter. ffmpeg's
+        # warnings are passed through on stderr, and stdout isn't used, so
+        # there are no output pipes which could fill up and block ffmpeg.
+        ffmpeg = Popen(
+            ffmpeg_cmdline,
+            stdin=PIPE,
+            stdout=DEVNULL,
+            stderr=None,
+            close_fds=True,
+            bufsize=0,
+        )
+        assert ffmpeg.stdin is not None
+        stdin_fd = ffmpeg.stdin.fileno()
+        try:
+            fcntl.fcntl(stdin_fd, F_SETPIPE_SZ, FFMPEG_PIPE_SIZE)
+        except OSError:
+            # The pipe size is limited by /proc/sys/fs/pipe-max-size, and it's
+            # fine to continue with the default size.
+            pass
+
+        def write_frame(buf: bytearray) -> None:
+            # Writes to a pipe can be short, so loop until the frame is written
+            view = memoryview(buf)
+            while view:
+                view = view[write(stdin_fd, view) :]
+
+        # The most recently written buffer is kept (rather than returned to the
+        # renderer) so it can be written again for repeated frames.
+        last_buf: Optional[bytearray] = None
         while True:
             buf = self.queue.get()
             if buf is None:
                 break
 
-            ffmpeg.stdin.write(buf)
+            if buf is EncoderCommand.REPEAT:
+                assert last_buf is not None
+                write_frame(last_buf)
+                continue
 
-            self.ret_queue.put(buf)
+            write_frame(buf)
+
+            if last_buf is not None:
+                self.ret_queue.put(last_buf)
+            last_buf = buf
 
         ffmpeg.stdin.close()
         ffmpeg.wait()
@@ -139,11 +323,13 @@ class Renderer:
     framerate: Fraction
     codec: Codec
     pod_id: str
+    hw_encoder: Optional[HardwareEncoder]
 
     frame: int
-    framestep: Fraction
-    pts: Fraction
+    first_frame: int
+    end_frame: int
     recording: bool
+    output_frames: int
 
     def __init__(
         self,
@@ -154,9 +340,10 @@ class Renderer:
         height: int,
         framerate: Fraction,
         codec: Codec,
-        start_time: Fraction,
-        end_time: Fraction,
+        start_time: Optional[Fraction],
+        end_time: Optional[Fraction],
         pod_id: str,
+        hw_encoder: Optional[HardwareEncoder] = None,
     ):
         self.events = events
         self.input = input
@@ -166,22 +353,26 @@ class Renderer:
         self.framerate = framerate
         self.codec = codec
         self.pod_id = pod_id
+        self.hw_encoder = hw_encoder
 
-        # Current video position state
-        self.frame = 1
-        self.framestep = 1 / framerate
-        self.pts = Fraction(0)
+        # Current video position state. Frame n is at pts n / framerate.
+        self.frame = 0
         self.recording = False
+        self.output_frames = 0
 
         # Only the section of recording within the time range of start_time
         # through end_time will be included in the final video
         if start_time is not None:
             self.start_time = start_time
         else:
-            self.start_time = 0
+            self.start_time = Fraction(0)
         assert events.length is not None
+        self.length = events.length
         if end_time is not None and end_time < events.length:
             self.length = end_time
+        # The range of frames with start_time <= pts < length
+        self.first_frame = ceil(self.start_time * framerate)
+        self.end_frame = ceil(self.length * framerate)
 
         # Cairo rendering context
         self.surface = cairo.ImageSurface(cairo.FORMAT_RGB24, self.width, self.height)
@@ -193,10 +384,14 @@ class Renderer:
         font_options.set_hint_style(cairo.HINT_STYLE_NONE)
         self.ctx.set_font_options(font_options)
 
+    @property
+    def pts(self) -> Fraction:
+        return Fraction(self.frame) / self.framerate
+
     def update_record(self, event: RecordEvent) -> None:
         if self.recording != event["status"]:
             self.recording = event["status"]
-            print(f"\tRenderer: recording: {self.recording}")
+            log.info("\tRenderer: recording: %s", self.recording)
 
     def render(self) -> None:
         cursor = CursorRenderer(
@@ -218,82 +413,93 @@ class Renderer:
         )
 
         encoder = Encoder(
-            self.output, self.width, self.height, self.framerate, self.codec
+            self.output,
+            self.width,
+            self.height,
+            self.framerate,
+            self.codec,
+            self.hw_encoder,
         )
 
         presentation_changed = True
         shapes_changed = False
         cursor_changed = False
         recording_changed = False
-        assert self.events.length is not None
-        while self.pts < self.events.length:
-            event_ts = Fraction(0)
-            while True:
-                if len(self.events.events) == 0:
-                    break
-
-                event = self.events.events[0]
-                event_ts = event["timestamp"]
-                if event_ts > self.pts:
-                    break
-
-                self.events.events.popleft()
+        frame_changed = False
+        # Event handlers, called in order for each event name
+        event_handlers: Dict[str, Tuple[Callable[[Any], None], ...]] = {
+            "cursor": (cursor.update_cursor,),
+            "cursor_v2": (cursor.update_cursor_v2,),
+            "pan_zoom": (presentation.update_pan_zoom,),
+            "presentation": (
+                tldraw.presentation_event,
+                presentation.update_presentation,
+                shapes.update_presentation,
+                cursor.update_presentation,
+            ),
+            "slide": (
+                tldraw.slide_event,
+                presentation.update_slide,
+                shapes.update_slide,
+                cursor.update_slide,
+            ),
+            "shape": (shapes.update_shape, cursor.update_shape),
+            "undo": (shapes.update_undo,),
+            "clear": (shapes.update_clear,),
+            "record": (self.update_record,),
+            "presenter": (cursor.update_presenter,),
+            "join": (cursor.update_join,),
+            "left": (cursor.update_left,),
+            # Handled by the tldraw renderer only
+            "tldraw.add_shape": (tldraw.add_shape_event,),
+            "tldraw.delete_shape": (tldraw.delete_shape_event,),
+            "tldraw.camera": (),
+        }
+        # Events which are for a specific pod
+        pod_event_names = frozenset(["pan_zoom", "presentation", "slide", "presenter"])
+
+        # The per-event and per-frame debug messages are skipped entirely
+        # unless debug logging is enabled.
+        debug = log.isEnabledFor(logging.DEBUG)
+
+        # Events are sorted by time, so they are processed in order by index
+        # rather than being removed from the events list. Each event is handled
+        # at the first frame with pts >= its timestamp, which is precomputed so
+        # the loop only needs integer math.
+        events = list(self.events.events)
+        event_frames = [ceil(event["timestamp"] * self.framerate) for event in events]
+        num_events = len(events)
+        next_event = 0
+        # Nothing is output before the first frame, so all events due by then
+        # are handled together on the first iteration.
+        for frame in range(self.first_frame, self.end_frame):
+            self.frame = frame
+            while next_event < num_events and event_frames[next_event] <= frame:
+                event = events[next_event]
+                next_event += 1
 
                 name = event["name"]
-                print(f"{float(event['timestamp']):012.6f} {event['name']}")
+                if debug:
+                    log.debug("%012.6f %s", event["timestamp"], name)
 
                 # Skip events that are for a different pod
-                if name in ["pan_zoom", "presentation", "slide", "presenter"]:
+                if name in pod_event_names:
                     pod_event = cast(PerPodEvent, event)
                     if pod_event["pod_id"] != self.pod_id:
-                        print(f"\tskipping event for pod {pod_event['pod_id']}")
+                        log.debug("\tskipping event for pod %s", pod_event["pod_id"])
                         continue
 
-                tldraw.update(event)
-
-                if name == "cursor":
-                    cursor.update_cursor(cast(events.CursorEvent, event))
-                elif name == "cursor_v2":
-                    cursor.update_cursor_v2(cast(events.WhiteboardCursorEvent, event))
-                elif name == "pan_zoom":
-                    presentation.update_pan_zoom(cast(events.PanZoomEvent, event))
-                elif name == "presentation":
-                    presentation_event = cast(events.PresentationEvent, event)
-                    presentation.update_presentation(presentation_event)
-                    shapes.update_presentation(presentation_event)
-                    cursor.update_presentation(presentation_event)
-                elif name == "slide":
-                    slide_event = cast(events.SlideEvent, event)
-                    presentation.update_slide(slide_event)
-                    shapes.update_slide(slide_event)
-                    cursor.update_slide(slide_event)
-                elif name == "shape":
-                    shape_event = cast(events.ShapeEvent, event)
-                    shapes.update_shape(shape_event)
-                    cursor.update_shape(shape_event)
-                elif name == "undo":
-                    shapes.update_undo(cast(events.UndoEvent, event))
-                elif name == "clear":
-                    shapes.update_clear(cast(events.ClearEvent, event))
-                elif name == "record":
-                    self.update_record(cast(events.RecordEvent, event))
+                handlers = event_handlers.get(name)
+                if handlers is None:
+                    log.debug("\tdon't know how to handle this event")
+                    continue
+                for handler in handlers:
+                    handler(event)
+
+                if name == "record":
                     recording_changed = True
-                elif name == "presenter":
-                    cursor.update_presenter(cast(events.PresenterEvent, event))
-                elif name == "join":
-                    cursor.update_join(cast(events.JoinEvent, event))
-                elif name == "left":
-                    cursor.update_left(cast(events.LeftEvent, event))
-                elif (
-                    name == "tldraw.add_shape"
-                    or name == "tldraw.delete_shape"
-                    or name == "tldraw.camera"
-                ):
-                    pass
-                else:
-                    print("\tdon't know how to handle this event")
 
-            if self.recording and self.pts >= self.start_time:
+            if self.recording:
                 start_time = time.perf_counter_ns()
 
                 presentation_changed = presentation.finalize_frame()
@@ -309,14 +515,8 @@ class Renderer:
                 ):
                     # Composite the frame
 
-                    # Base background color
-                    ctx = self.ctx
-                    ctx.save()
-                    ctx.set_source_rgb(*DRAWING_BG)
-                    ctx.paint()
-                    ctx.restore()
-
-                    # Presentation
+                    # Presentation, including the background. This replaces
+                    # the previous frame's contents.
                     presentation.render()
 
                     # Shapes
@@ -327,24 +527,181 @@ class Renderer:
                     cursor.render()
 
                     recording_changed = True
+                    frame_changed = True
 
-                self.surface.flush()
-
-                if recording_changed:
+                if recording_changed and debug:
                     end_time = time.perf_counter_ns()
-                    print(
-                        f"-- {float(self.pts):012.6f} frame {self.frame} ({(end_time - start_time) / 1000000:.3f}ms)"
+                    log.debug(
+                        "-- %012.6f frame %d (%.3fms)",
+                        self.pts,
+                        self.frame,
+                        (end_time - start_time) / 1000000,
                     )
 
-                # Output a frame
-                encoder.put(bytearray(self.surface.get_data()))
-
-            self.frame += 1
-            self.pts += self.framestep
+                # Output a frame. If nothing was composited, the surface still
+                # holds the previously output frame, so it doesn't need to be
+                # flushed and copied to the encoder again.
+                if frame_changed or self.output_frames == 0:
+                    self.surface.flush()
+                    encoder.put(self.surface.get_data())
+                else:
+                    encoder.repeat_last()
+                self.output_frames += 1
 
             presentation_changed = False
             shapes_changed = False
             cursor_changed = False
             recording_changed = False
+            frame_changed = False
 
         encoder.join()
+
+
+def render_section(
+    events: EventsInfo,
+    input: str,
+    output: str,
+    width: int,
+    height: int,
+    framerate: Fraction,
+    codec: Codec,
+    start_time: Fraction,
+    end_time: Fraction,
+    pod_id: str,
+    hw_encoder: Optional[HardwareEncoder],
+) -> int:
+    """Render a section of the recording, returning the number of frames output."""
+    renderer = Renderer(
+        events,
+        input,
+        output,
+        width,
+        height,
+        framerate,
+        codec,
+        start_time,
+        end_time,
+        pod_id,
+        hw_encoder,
+    )
+    renderer.render()
+    return renderer.output_frames
+
+
+def section_frame_bounds(first_frame: int, end_frame: int, jobs: int) -> List[int]:
+    """Split a range of frames into at most `jobs` sections of nearly equal length.
+
+    :returns: The frame boundaries. Section i has the frames from bounds[i] up to
+        (but not including) bounds[i + 1].
+    """
+    return sorted(
+        set(
+            first_frame + (end_frame - first_frame) * i // jobs for i in range(jobs + 1)
+        )
+    )
+
+
+def write_concat_list(
+    concat_list: str,
+    section_outputs: Sequence[str],
+    section_frames: Sequence[int],
+    framerate: Fraction,
+) -> None:
+    """Write an ffmpeg concat demuxer script joining the rendered sections.
+
+    The sections must be in the same directory as the script, since they are
+    listed by file name only.
+    """
+    # mpdecimate can drop repeated frames at the end of a section, so the
+    # section durations are given explicitly to keep the timing correct.
+    with open(concat_list, "w") as f:
+        for section_output, frames in zip(section_outputs, section_frames):
+            if frames == 0:
+                continue
+            name = path.basename(section_output).replace("'", "'\\''")
+            f.write(f"file '{name}'\n")
+            f.write(f"duration {float(frames / framerate):.6f}\n")
+
+
+def render_parallel(
+    jobs: int,
+    events: EventsInfo,
+    input: str,
+    output: str,
+    width: int,
+    height: int,
+    framerate: Fraction,
+    codec: Codec,
+    start_time: Optional[Fraction],
+    end_time: Optional[Fraction],
+    pod_id: str,
+    hw_encoder: Optional[HardwareEncoder] = None,
+) -> None:
+    """Render the recording as multiple sections in parallel processes.
+
+    The sections are split on frame boundaries, and each one is rendered by a
+    separate Renderer which replays all the events from the start of the recording
+    to get the correct state at the start of its section. The section videos are
+    then joined with the ffmpeg concat demuxer without re-encoding.
+    """
+    assert events.length is not None
+    length = events.length
+    if end_time is not None and end_time < length:
+        length = end_time
+
+    # Frame n is at pts n / framerate; find the frames within the time range
+    first_frame = ceil(start_time * framerate) if start_time is not None else 0
+    end_frame = ceil(length * framerate)
+    frame_bounds = section_frame_bounds(first_frame, end_frame, jobs)
+
+    with TemporaryDirectory(
+        prefix="bbb-presentation-video-", dir=path.dirname(path.abspath(output))
+    ) as tmpdir:
+        section_outputs = [
+            path.join(tmpdir, f"section-{i:d}.mkv")
+            for i in range(len(frame_bounds) - 1)
+        ]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(
+                    render_section,
+                    events,
+                    input,
+                    section_output,
+                    width,
+                    height,
+                    framerate,
+                    codec,
+                    Fraction(section_start) / framerate,
+                    Fraction(section_end) / framerate,
+                    pod_id,
+                    hw_encoder,
+                )
+                for section_output, section_start, section_end in zip(
+                    section_outputs, frame_bounds, frame_bounds[1:]
+                )
+            ]
+            section_frames = [future.result() for future in futures]
+
+        concat_list = path.join(tmpdir, "concat.txt")
+        write_concat_list(concat_list, section_outputs, section_frames, framerate)
+
+        concat_cmdline = [
+            "ffmpeg",
+            "-y",
+            "-nostats",
+            "-v",
+            "warning",
+            "-f",
+            "concat",
+            "-i",
+            concat_list,
+            "-c",
+            "copy",
+            "-f",
+            "matroska",
+            output,
+        ]
+        concat = run(concat_cmdline, stdin=DEVNULL)
+        if concat.returncode != 0:
+            raise CalledProcessError(returncode=concat.returncode, cmd=concat_cmdline)
@@ -4,8 +4,9 @@
 
 from __future__ import annotations
 
-from math import pi, sqrt
-from typing import Dict, Generic, Optional, TypeVar
+import logging
+from math import ceil, pi, sqrt
+from typing import Dict, Generic, Optional, Tuple, TypeVar
 
 import attr
 import cairo
@@ -34,6 +35,8 @@ CURSOR_RADIUS = 0.005  # 6px on 960x720
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def apply_legacy_cursor_transform(
     ctx: cairo.Context[CairoSomeSurface], t: Transform
@@ -46,6 +49,21 @@ def apply_legacy_cursor_transform(
     ctx.clip()
 
 
+def create_cursor_mask(radius: float) -> Tuple[cairo.ImageSurface, float]:
+    """Draw a cursor circle with the given radius (in device units) to a mask.
+
+    :returns: The mask surface, and the offset of the circle center in it.
+    """
+    offset = ceil(radius) + 1
+    size = offset * 2
+    mask = cairo.ImageSurface(cairo.FORMAT_A8, size, size)
+    ctx = cairo.Context(mask)
+    ctx.arc(offset, offset, radius, 0, 2 * pi)
+    ctx.fill()
+    mask.flush()
+    return mask, offset
+
+
 @attr.s(order=False, slots=True, auto_attribs=True)
 class Cursor:
     label: Optional[str]
@@ -68,6 +86,8 @@ class CursorRenderer(Generic[CairoSomeSurface]):
 
     pattern: Optional[cairo.Pattern]
     radius: float
+    cursor_mask: cairo.ImageSurface
+    cursor_mask_offset: float
 
     def __init__(
         self,
@@ -93,11 +113,29 @@ class CursorRenderer(Generic[CairoSomeSurface]):
         self.radius = CURSOR_RADIUS * sqrt(
             size.width * size.width + size.height * size.height
         )
+        # The cursor radius is the same in device units for all cursors, so
+        # the circle is only rasterized once.
+        self.cursor_mask, self.cursor_mask_offset = create_cursor_mask(self.radius)
+
+    def hide_cursors(self) -> bool:
+        """Move all cursors offscreen, returning whether any were visible."""
+        visible = False
+        for cursor in self.cursors.values():
+            if cursor.position is not None:
+                cursor.position = None
+                visible = True
+        return visible
+
+    def cursor_visible(self, user_id: Optional[str]) -> bool:
+        if user_id is None:
+            return False
+        cursor = self.cursors.get(user_id)
+        return cursor is not None and cursor.position is not None
 
     def update_presentation(self, event: PresentationEvent) -> None:
         presentation = event["presentation"]
         if self.presentation == presentation:
-            print("\tCursor: presentation did not change")
+            log.debug("\tCursor: presentation did not change")
             return
         self.presentation = presentation
 
@@ -105,37 +143,38 @@ class CursorRenderer(Generic[CairoSomeSurface]):
         self.slide = self.presentation_slide.get(presentation, 0)
 
         # All cursors are hidden on presentation/slide switch
-        for user_id, cursor in self.cursors.items():
-            cursor.position = None
-        self.cursors_changed = True
-        print("\tCursor: all cursors moved offscreen")
+        if self.hide_cursors():
+            self.cursors_changed = True
+        log.debug("\tCursor: all cursors moved offscreen")
 
-        print(f"\tCursor: presentation: {self.presentation}")
-        print(f"\tCursor: slide: {self.slide}")
+        log.debug("\tCursor: presentation: %s", self.presentation)
+        log.debug("\tCursor: slide: %s", self.slide)
 
     def update_slide(self, event: SlideEvent) -> None:
         if self.slide == event["slide"]:
-            print("\tCursor: slide did not change")
+            log.debug("\tCursor: slide did not change")
             return
         self.slide = event["slide"]
         if self.presentation is not None:
             self.presentation_slide[self.presentation] = self.slide
 
         # All cursors are hidden on presentation/slide switch
-        for cursor in self.cursors.values():
-            cursor.position = None
-        print("\tCursor: all cursors moved offscreen")
-        self.cursors_changed = True
+        if self.hide_cursors():
+            self.cursors_changed = True
+        log.debug("\tCursor: all cursors moved offscreen")
 
-        print(f"\tCursor: slide: {self.slide}")
+        log.debug("\tCursor: slide: %s", self.slide)
 
     def update_presenter(self, event: PresenterEvent) -> None:
         if self.presenter == event["user_id"]:
-            print("\tCursor: presenter did not change")
+            log.debug("\tCursor: presenter did not change")
             return
+        prev_presenter = self.presenter
         self.presenter = event["user_id"]
-        print(f"\tCursor: presenter is now {self.presenter}")
-        self.cursors_changed = True
+        log.debug("\tCursor: presenter is now %s", self.presenter)
+        # Only the presenter's cursor is drawn differently
+        if self.cursor_visible(prev_presenter) or self.cursor_visible(self.presenter):
+            self.cursors_changed = True
 
     def update_join(self, event: JoinEvent) -> None:
         self.cursors[event["user_id"]] = Cursor(label=event["user_name"])
@@ -143,19 +182,19 @@ class CursorRenderer(Generic[CairoSomeSurface]):
     def update_left(self, event: LeftEvent) -> None:
         cursor = self.cursors.pop(event["user_id"], None)
         if cursor is not None and cursor.position is not None:
-            print(f"\tCursors: removing cursor for {event['user_id']}")
+            log.debug("\tCursors: removing cursor for %s", event["user_id"])
             self.cursors_changed = True
 
     def update_cursor(self, event: CursorEvent) -> None:
         cursor = self.legacy_cursor
         if cursor.position == event["cursor"]:
-            print("\tLegacy cursor: position did not change")
+            log.debug("\tLegacy cursor: position did not change")
             return
         cursor.position = event["cursor"]
         if cursor.position is not None:
-            print(f"\tLegacy cursor: position: {cursor.position * 100}")
+            log.debug("\tLegacy cursor: position: %s", cursor.position * 100)
         else:
-            print("\tLegacy cursor: offscreen")
+            log.debug("\tLegacy cursor: offscreen")
         self.cursors_changed = True
 
     def update_cursor_v2(self, event: WhiteboardCursorEvent) -> None:
@@ -165,27 +204,31 @@ class CursorRenderer(Generic[CairoSomeSurface]):
         slide = event.get("slide")
         if presentation is not None or slide is not None:
             if presentation != self.presentation or slide != self.slide:
-                print("\tCursor: not on current presentation/slide, skipping")
+                log.debug("\tCursor: not on current presentation/slide, skipping")
                 return
 
         user_id = event["user_id"]
         cursor = self.cursors.get(user_id)
         if cursor is None:
-            print(f"\tCursor: user_id {user_id}: user not present, ignoring")
+            log.debug("\tCursor: user_id %s: user not present, ignoring", user_id)
             return
 
         if cursor.position == event["cursor"]:
-            print(f"\tCursor: user_id {user_id}: position did not change")
+            log.debug("\tCursor: user_id %s: position did not change", user_id)
             return
 
         cursor.position = event["cursor"]
         if cursor.position is not None:
             if self.tldraw_whiteboard:
-                print(f"\tCursor: user_id: {user_id}, position: {cursor.position}")
+                log.debug(
+                    "\tCursor: user_id: %s, position: %s", user_id, cursor.position
+                )
             else:
-                print(f"\tCursor: user_id {user_id}: position: {cursor.position * 100}")
+                log.debug(
+                    "\tCursor: user_id %s: position: %s", user_id, cursor.position * 100
+                )
         else:
-            print(f"\tCursor: user_id {user_id}: offscreen")
+            log.debug("\tCursor: user_id %s: offscreen", user_id)
         self.cursors_changed = True
 
     # To make the recording look prettier, use some shape updates to also
@@ -213,13 +256,26 @@ class CursorRenderer(Generic[CairoSomeSurface]):
             and event["shape_status"] != ShapeStatus.DRAW_END
         ):
             cursor.position = event["points"][-1]
-            print(
-                f"\tCursor: user_id {user_id}: update from shape, position: {cursor.position * 100}"
+            log.debug(
+                "\tCursor: user_id %s: update from shape, position: %s",
+                user_id,
+                cursor.position * 100,
             )
             self.cursors_changed = True
 
+    def draw_cursor(self, x: float, y: float) -> None:
+        """Draw a cursor with the current source at a position in device coordinates.
+
+        The current transformation matrix must be the identity matrix.
+        """
+        ctx = self.ctx
+        offset = self.cursor_mask_offset
+        ctx.mask_surface(self.cursor_mask, x - offset, y - offset)
+
     def finalize_frame(self, transform: Transform) -> bool:
-        if (not self.cursors_changed) and self.transform == transform:
+        if (not self.cursors_changed) and (
+            self.transform is transform or self.transform == transform
+        ):
             return False
 
         self.transform = transform
@@ -236,42 +292,52 @@ class CursorRenderer(Generic[CairoSomeSurface]):
             screen_pos = Position(
                 (x2 - x1) * cursor.position.x, (y2 - y1) * cursor.position.y
             )
-            print(f"\tLegacy cursor: screen position: {screen_pos}")
+            log.debug("\tLegacy cursor: screen position: %s", screen_pos)
 
-            ctx.translate(*screen_pos)
-            ctx.arc(0, 0, self.radius, 0, 2 * pi)
+            x, y = ctx.user_to_device(screen_pos.x, screen_pos.y)
+            ctx.identity_matrix()
             ctx.set_source_rgba(*CURSOR_PRESENTER)
-            ctx.fill()
+            self.draw_cursor(x, y)
             ctx.restore()
 
+        # The slide transform is the same for all cursors, so it's applied once
+        # and the cursor positions are converted to device coordinates.
+        ctx.save()
+        apply_shapes_transform(ctx, transform)
+        matrix = ctx.get_matrix()
+        ctx.identity_matrix()
+        # Legacy whiteboard cursor positions are relative to the slide size
+        if self.tldraw_whiteboard:
+            scale_x = scale_y = 1.0
+        else:
+            scale_x = transform.shapes_size.width
+            scale_y = transform.shapes_size.height
+        # Other users' cursors are drawn beneath anything already drawn (the
+        # legacy cursor), then the presenter's cursor is drawn on top. This
+        # only needs the source and operator set once per pass.
+        presenter = self.presenter
+        presenter_position = None
+        ctx.set_source_rgba(*CURSOR_OTHER)
+        ctx.set_operator(cairo.OPERATOR_DEST_OVER)
         for user_id, cursor in self.cursors.items():
-            if cursor.position is None:
+            position = cursor.position
+            if position is None:
                 continue
 
-            ctx.save()
-            apply_shapes_transform(ctx, transform)
-            if self.tldraw_whiteboard:
-                pos = cursor.position
-            else:
-                pos = Position(
-                    cursor.position.x * transform.shapes_size.width,
-                    cursor.position.y * transform.shapes_size.height,
-                )
-            print(f"\tCursor: user_id: {user_id}: slide position: {pos}")
+            x = position.x * scale_x
+            y = position.y * scale_y
+            log.debug("\tCursor: user_id: %s: slide position: (%s, %s)", user_id, x, y)
 
-            ctx.translate(*pos)
-
-            ctx.arc(
-                0, 0, self.radius / transform.shapes_scale / transform.scale, 0, 2 * pi
-            )
-            if user_id == self.presenter:
-                ctx.set_source_rgba(*CURSOR_PRESENTER)
-                ctx.set_operator(cairo.OPERATOR_OVER)
+            x, y = matrix.transform_point(x, y)
+            if user_id == presenter:
+                presenter_position = (x, y)
             else:
-                ctx.set_source_rgba(*CURSOR_OTHER)
-                ctx.set_operator(cairo.OPERATOR_DEST_OVER)
-            ctx.fill()
-            ctx.restore()
+                self.draw_cursor(x, y)
+        if presenter_position is not None:
+            ctx.set_source_rgba(*CURSOR_PRESENTER)
+            ctx.set_operator(cairo.OPERATOR_OVER)
+            self.draw_cursor(*presenter_position)
+        ctx.restore()
 
         self.pattern = ctx.pop_group()
 
@@ -4,12 +4,14 @@
 from __future__ import annotations
 
 import atexit
+import logging
+from collections import OrderedDict
 from contextlib import ExitStack
 from enum import Enum
 from importlib import resources
-from math import ceil, floor
-from os import PathLike, fspath, path
-from typing import Any, Dict, Generic, Optional, TypeVar, Union
+from math import ceil, floor, isclose
+from os import PathLike, fspath, listdir
+from typing import Any, Dict, Generic, Optional, Tuple, TypeVar, Union
 
 import attr
 import cairo
@@ -25,7 +27,9 @@ gi.require_version("Poppler", "0.18")
 from gi.repository import Gdk, GdkPixbuf, Gio, GLib, Poppler
 
 from bbb_presentation_video import events
-from bbb_presentation_video.events.helpers import Position, Size
+from bbb_presentation_video.events.helpers import Color, Position, Size
+
+log = logging.getLogger(__name__)
 
 
 class ImageType(Enum):
@@ -60,8 +64,17 @@ DRAWING_SIZE = 1200
 TLDRAW_DRAWING_SIZE_2_6_0 = Size(2048, 1536)
 TLDRAW_DRAWING_SIZE_2_6_1 = Size(1440, 1080)
 
+DRAWING_BG = Color.from_int(0xE2E8ED)
+
 PDF_MAX_ZOOM = 10.0
 PDF_MAX_SIZE = 32767  # Max image dimension supported by cairo
+# Pan/zoom changes smaller than this are ignored
+PAN_ZOOM_TOLERANCE = 1e-6
+# Number of recently used presentation files to keep loaded
+SOURCE_CACHE_SIZE = 4
+# Memory limit for rendered PDF pages kept for reuse when panning, or when
+# returning to a recently shown page.
+PDF_CACHE_MAX_BYTES = 256 * 1024 * 1024
 
 
 @attr.s(order=False, slots=True, auto_attribs=True)
@@ -78,11 +91,22 @@ CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
 
 def apply_slide_transform(ctx: cairo.Context[CairoSomeSurface], t: Transform) -> None:
-    ctx.translate(t.padding.width, t.padding.height)
-    ctx.scale(t.scale, t.scale)
-    ctx.rectangle(0, 0, t.size.width, t.size.height)
+    # Padding, scale and pan combined into a single matrix; the clip rectangle
+    # is offset by the pan position to match.
+    scale = t.scale
+    pos = t.pos
+    ctx.transform(
+        cairo.Matrix(
+            scale,
+            0,
+            0,
+            scale,
+            t.padding.width - scale * pos.x,
+            t.padding.height - scale * pos.y,
+        )
+    )
+    ctx.rectangle(pos.x, pos.y, t.size.width, t.size.height)
     ctx.clip()
-    ctx.translate(-t.pos.x, -t.pos.y)
 
 
 def apply_shapes_transform(ctx: cairo.Context[CairoSomeSurface], t: Transform) -> Size:
@@ -91,6 +115,31 @@ def apply_shapes_transform(ctx: cairo.Context[CairoSomeSurface], t: Transform) -
     return t.shapes_size
 
 
+def pixbuf_to_surface(pixbuf: GdkPixbuf.Pixbuf) -> cairo.ImageSurface:
+    """Convert an image slide to a cairo surface, on a white background.
+
+    The pixbuf's pixel format differs from cairo's, so it is converted once
+    when the slide is loaded rather than every time it is drawn.
+    """
+    has_alpha = pixbuf.get_has_alpha()
+    surface = cairo.ImageSurface(
+        cairo.FORMAT_ARGB32 if has_alpha else cairo.FORMAT_RGB24,
+        pixbuf.get_width(),
+        pixbuf.get_height(),
+    )
+    ctx = cairo.Context(surface)
+    Gdk.cairo_set_source_pixbuf(ctx, pixbuf, 0, 0)
+    ctx.set_operator(cairo.OPERATOR_SOURCE)
+    ctx.paint()
+    # Fill in an opaque white background behind transparent images (PNGs...)
+    if has_alpha:
+        ctx.set_source_rgb(1, 1, 1)
+        ctx.set_operator(cairo.OPERATOR_DEST_OVER)
+        ctx.paint()
+    surface.flush()
+    return surface
+
+
 class PresentationRenderer(Generic[CairoSomeSurface]):
     ctx: cairo.Context[CairoSomeSurface]
     directory: str
@@ -115,7 +164,12 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
     source: Optional[Union[Poppler.Document, GdkPixbuf.Pixbuf]]
     page: Optional[Union[Poppler.Page, GdkPixbuf.Pixbuf]]
     page_size: Optional[Size]
+    image_surface: Optional[cairo.ImageSurface]
     pattern: Optional[cairo.Pattern]
+    background: cairo.SolidPattern
+    source_cache: OrderedDict[Any, Union[Poppler.Document, GdkPixbuf.Pixbuf]]
+    pdf_cache: OrderedDict[Tuple[Any, int, float], cairo.ImageSurface]
+    pdf_cache_bytes: int
 
     def __init__(
         self,
@@ -158,7 +212,12 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
         self.source = None
         self.page = None
         self.page_size = None
+        self.image_surface = None
         self.pattern = None
+        self.background = cairo.SolidPattern(*DRAWING_BG)
+        self.source_cache = OrderedDict()
+        self.pdf_cache = OrderedDict()
+        self.pdf_cache_bytes = 0
 
         # Initial transform is mostly-valid, but useless
         self.trans = Transform(
@@ -179,22 +238,26 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
         return self.trans
 
     def print_transform(self) -> None:
-        print(f"\tPresentation: padding: {self.trans.padding}")
-        print(
-            f"\tPresentation: slide size: {self.trans.size}, "
-            f"scale: {self.trans.scale:.6f}, position: {self.trans.pos}]"
-        )
-        print(
-            f"\tPresentation: slide scaled size: {self.trans.size * self.trans.scale}"
+        if not log.isEnabledFor(logging.DEBUG):
+            return
+        trans = self.trans
+        log.debug("\tPresentation: padding: %s", trans.padding)
+        log.debug(
+            "\tPresentation: slide size: %s, scale: %.6f, position: %s]",
+            trans.size,
+            trans.scale,
+            trans.pos,
         )
-        print(
-            f"\tPresentation: shapes size: {self.trans.shapes_size}, "
-            f"scale: {self.trans.shapes_scale:.6f}"
+        log.debug("\tPresentation: slide scaled size: %s", trans.size * trans.scale)
+        log.debug(
+            "\tPresentation: shapes size: %s, scale: %.6f",
+            trans.shapes_size,
+            trans.shapes_scale,
         )
 
     def update_presentation(self, event: events.PresentationEvent) -> None:
         if self.presentation == event["presentation"]:
-            print("\tPresentation: presentation did not change")
+            log.debug("\tPresentation: presentation did not change")
             return
         self.presentation = event["presentation"]
         self.presentation_changed = True
@@ -204,33 +267,87 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
         self.pan = Position(0.0, 0.0)
         self.zoom = Size(1.0, 1.0)
         self.pan_zoom_changed = True
-        print(f"\tPresentation: presentation: {self.presentation}")
-        print(f"\tPresentation: slide: {self.slide}")
+        log.debug("\tPresentation: presentation: %s", self.presentation)
+        log.debug("\tPresentation: slide: %s", self.slide)
 
     def update_slide(self, event: events.SlideEvent) -> None:
         if self.slide == event["slide"]:
-            print("\tPresentation: slide did not change")
+            log.debug("\tPresentation: slide did not change")
             return
         self.slide = event["slide"]
         if self.presentation is not None:
             self.presentation_slide[self.presentation] = self.slide
         self.slide_changed = True
-        print(f"\tPresentation: slide: {self.slide}")
+        log.debug("\tPresentation: slide: %s", self.slide)
 
     def update_pan_zoom(self, event: events.PanZoomEvent) -> None:
-        if self.pan == event["pan"] and self.zoom == event["zoom"]:
-            print("\tPresentation: pan/zoom did not change")
+        pan = event["pan"]
+        zoom = event["zoom"]
+        # Ignore differences too small to change the rendered view
+        if (
+            isclose(self.pan.x, pan.x, abs_tol=PAN_ZOOM_TOLERANCE)
+            and isclose(self.pan.y, pan.y, abs_tol=PAN_ZOOM_TOLERANCE)
+            and isclose(self.zoom.width, zoom.width, abs_tol=PAN_ZOOM_TOLERANCE)
+            and isclose(self.zoom.height, zoom.height, abs_tol=PAN_ZOOM_TOLERANCE)
+        ):
+            log.debug("\tPresentation: pan/zoom did not change")
             return
-        self.pan = event["pan"]
-        self.zoom = event["zoom"]
+        self.pan = pan
+        self.zoom = zoom
         self.pan_zoom_changed = True
-        print(f"\tPresentation: pan: {self.pan} zoom: {self.zoom}")
+        log.debug("\tPresentation: pan: %s zoom: %s", self.pan, self.zoom)
+
+    def cache_source(
+        self,
+        filename: Union[str, bytes, PathLike[Any]],
+        source: Union[Poppler.Document, GdkPixbuf.Pixbuf],
+    ) -> None:
+        self.source_cache[filename] = source
+        if len(self.source_cache) > SOURCE_CACHE_SIZE:
+            self.source_cache.popitem(last=False)
+
+    def render_pdf_page(
+        self, width: int, height: int, render_scale: float
+    ) -> cairo.ImageSurface:
+        """Get an image of the current pdf page, rendered at the given scale.
+
+        Recently rendered pages are cached, so that a page doesn't need to be
+        rendered again when it is only panned.
+        """
+        assert isinstance(self.page, Poppler.Page)
+
+        key = (self.filename, self.slide, render_scale)
+        pdfSurface = self.pdf_cache.get(key)
+        if pdfSurface is not None:
+            self.pdf_cache.move_to_end(key)
+            log.debug("\tPresentation: reusing rendered PDF page")
+            return pdfSurface
+
+        # Render the entire pdf page to a new image surface without clipping, to
+        # work around poppler bugs
+        pdfSurface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+        pdfCtx = cairo.Context(pdfSurface)
+        # on an opaque white background
+        pdfCtx.set_source_rgb(1, 1, 1)
+        pdfCtx.paint()
+        pdfCtx.scale(render_scale, render_scale)
+        self.page.render(pdfCtx)
+
+        size = pdfSurface.get_stride() * height
+        self.pdf_cache[key] = pdfSurface
+        self.pdf_cache_bytes += size
+        while self.pdf_cache_bytes > PDF_CACHE_MAX_BYTES and len(self.pdf_cache) > 1:
+            _, evicted = self.pdf_cache.popitem(last=False)
+            self.pdf_cache_bytes -= evicted.get_stride() * evicted.get_height()
+
+        return pdfSurface
 
     def render_pdf(self) -> None:
         assert isinstance(self.page, Poppler.Page)
         assert self.page_size is not None
 
         ctx = self.ctx
+        trans = self.trans
 
         # This bit of nastiness is to work around Poppler bugs,
         # which would otherwise contaminate the main cairo ctx
@@ -238,8 +355,9 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
         try:
             # Limit the max size that we render the page at. If the zoom would need it
             # to be rendered at higher size, we'll render it blurry, but that's ok.
-            scaled_width = self.page_size.width * self.trans.scale
-            scaled_height = self.page_size.height * self.trans.scale
+            scale = trans.scale
+            scaled_width = self.page_size.width * scale
+            scaled_height = self.page_size.height * scale
             pdf_scale = max(
                 # Absolute max width/height based on max zoom and cairo limits
                 scaled_width / self.pdf_max_size.width,
@@ -250,19 +368,14 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
             width = max(ceil(scaled_width / pdf_scale), 1)
             height = max(ceil(scaled_height / pdf_scale), 1)
 
-            print(
-                f"\tPresentation: PDF surface size {width}x{height}, scale {pdf_scale:.3f}"
+            log.debug(
+                "\tPresentation: PDF surface size %sx%s, scale %.3f",
+                width,
+                height,
+                pdf_scale,
             )
 
-            # Render the entire pdf page to a new image surface without clipping, to
-            # work around poppler bugs
-            pdfSurface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
-            pdfCtx = cairo.Context(pdfSurface)
-            # on an opaque white background
-            pdfCtx.set_source_rgb(1, 1, 1)
-            pdfCtx.paint()
-            pdfCtx.scale(self.trans.scale / pdf_scale, self.trans.scale / pdf_scale)
-            self.page.render(pdfCtx)
+            pdfSurface = self.render_pdf_page(width, height, scale / pdf_scale)
 
             pdfPattern = cairo.SurfacePattern(pdfSurface)
 
@@ -270,30 +383,26 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
             # usually rendered at 1:1 pixel ratio, so only translation and clipping
             # should be used. Since it's an img src, it should be pixel aligned.
             # padding
-            ctx.translate(
-                floor(self.trans.padding.width),
-                floor(self.trans.padding.height),
-            )
+            padding = trans.padding
+            ctx.translate(floor(padding.width), floor(padding.height))
             # clipping
-            ctx.rectangle(
-                0,
-                0,
-                ceil(self.trans.size.width * self.trans.scale),
-                ceil(self.trans.size.height * self.trans.scale),
-            )
+            size = trans.size
+            ctx.rectangle(0, 0, ceil(size.width * scale), ceil(size.height * scale))
             ctx.clip()
             # panning
-            ctx.translate(
-                ceil(-self.trans.pos.x * self.trans.scale),
-                ceil(-self.trans.pos.y * self.trans.scale),
-            )
+            pos = trans.pos
+            ctx.translate(ceil(-pos.x * scale), ceil(-pos.y * scale))
             # scaling, if slide exceeded max resolution
             if pdf_scale > 1.0:
                 ctx.scale(pdf_scale, pdf_scale)
+                pdfPattern.set_filter(cairo.FILTER_BILINEAR)
+            else:
+                # Pixel aligned copy, so no filtering is needed
+                pdfPattern.set_filter(cairo.FILTER_FAST)
             ctx.set_source(pdfPattern)
             ctx.paint()
         except (SystemError, MemoryError) as e:
-            print(f"Poppler rendering failed: {e}")
+            log.warning("Poppler rendering failed: %s", e)
 
     def finalize_frame(self) -> bool:
         needs_render = False
@@ -308,21 +417,38 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
                 self.filename = None
                 self.filetype = ImageType.MISSING
                 if self.presentation is not None:
+                    # List the directory once rather than checking for each
+                    # possible file name.
+                    directory = f"{self.directory}/presentation/{self.presentation}"
+                    try:
+                        names = set(listdir(directory))
+                    except OSError:
+                        names = set()
                     for extension in TYPE_MAP:
-                        filename = f"{self.directory}/presentation/{self.presentation}/{self.presentation}.{extension}"
-                        if path.exists(filename):
-                            self.filename = filename
+                        name = f"{self.presentation}.{extension}"
+                        if name in names:
+                            self.filename = f"{directory}/{name}"
                             self.filetype = TYPE_MAP[extension]
                             break
-            print(f"\tPresentation: filename: {self.filename}, type: {self.filetype}")
+            log.debug(
+                "\tPresentation: filename: %s, type: %s", self.filename, self.filetype
+            )
 
-            # Load the source for the new presentation
-            if self.filetype is ImageType.IMAGE:
+            # Load the source for the new presentation, reusing it if it was
+            # recently loaded
+            cached_source = None
+            if self.filename is not None:
+                cached_source = self.source_cache.get(self.filename)
+            if cached_source is not None:
+                self.source_cache.move_to_end(self.filename)
+                self.source = cached_source
+            elif self.filetype is ImageType.IMAGE:
                 assert self.filename is not None
                 try:
                     self.source = GdkPixbuf.Pixbuf.new_from_file(fspath(self.filename))
+                    self.cache_source(self.filename, self.source)
                 except GLib.Error as error:
-                    print(f"Failed to read image: {error}")
+                    log.warning("Failed to read image: %s", error)
                     self.presentation = None
                     self.filetype = ImageType.MISSING
             elif self.filetype is ImageType.PDF:
@@ -330,19 +456,22 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
                 try:
                     gfile = Gio.File.new_for_path(fspath(self.filename))
                     self.source = Poppler.Document.new_from_gfile(gfile, None, None)
+                    self.cache_source(self.filename, self.source)
                 except GLib.Error as error:
-                    print(f"Failed to read pdf: {error}")
+                    log.warning("Failed to read pdf: %s", error)
                     self.presentation = None
                     self.filetype = ImageType.MISSING
 
         if self.slide_changed or needs_render:
             needs_render = True
             # Load the correct page
+            self.image_surface = None
             if self.filetype is ImageType.IMAGE:
                 assert isinstance(self.source, GdkPixbuf.Pixbuf)
                 if self.slide == 0:
                     self.page = self.source
                     self.page_size = Size(self.page.get_width(), self.page.get_height())
+                    self.image_surface = pixbuf_to_surface(self.page)
                 else:
                     self.page = None
                     self.page_size = None
@@ -358,70 +487,85 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
                     self.page_size = None
             else:
                 self.page = None
-            print(f"\tPresentation: page size: {self.page_size}")
+            log.debug("\tPresentation: page size: %s", self.page_size)
 
         if self.pan_zoom_changed or needs_render:
             # Calculate the updated slide transformation
-            needs_render = True
-
             # Fallback page size in case the slide did not load
             if self.page_size is None:
                 self.page_size = Size(self.size)
 
+            # The transform is calculated with plain floats, and the helper
+            # objects are only created for the final Transform.
+            page_width, page_height = self.page_size.width, self.page_size.height
+            view_width, view_height = self.size.width, self.size.height
+
             # The size of the portion of the slide that will be shown
             # zoom is a value in the interval (0, 1]
-            size = Size(
-                self.page_size.width * self.zoom.width,
-                self.page_size.height * self.zoom.height,
-            )
+            width = page_width * self.zoom.width
+            height = page_height * self.zoom.height
             # Determine the scale to make the visible portion of the slide fit the viewport
-            scale = min(self.size.width / size.width, self.size.height / size.height)
-            scaled_size = size * scale
+            scale = min(view_width / width, view_height / height)
 
             # Area above/below or left/right of visible portion that's empty in the viewport
-            padding = Size(
-                (self.size.width - scaled_size.width) / 2.0,
-                (self.size.height - scaled_size.height) / 2.0,
-            )
-
-            # Calculate scale for whiteboard drawing relative to page size
-            if self.tldraw_whiteboard:
-                shapes_scale = max(
-                    self.page_size.height / self.tldraw_drawing_size.height,
-                    self.page_size.width / self.tldraw_drawing_size.width,
-                )
+            padding_x = (view_width - width * scale) / 2.0
+            padding_y = (view_height - height * scale) / 2.0
+
+            # Calculate scale for whiteboard drawing relative to page size. This
+            # only depends on the page size, so it's reused on pan/zoom.
+            if not needs_render:
+                shapes_scale = self.trans.shapes_scale
+                shapes_size = self.trans.shapes_size
             else:
-                shapes_scale = max(
-                    self.page_size.width / DRAWING_SIZE,
-                    self.page_size.height / DRAWING_SIZE,
+                if self.tldraw_whiteboard:
+                    shapes_scale = max(
+                        page_height / self.tldraw_drawing_size.height,
+                        page_width / self.tldraw_drawing_size.width,
+                    )
+                else:
+                    shapes_scale = max(
+                        page_width / DRAWING_SIZE, page_height / DRAWING_SIZE
+                    )
+                shapes_size = Size(
+                    page_width / shapes_scale, page_height / shapes_scale
                 )
-            shapes_size = self.page_size / shapes_scale
 
             # Determine pan position (where the top left of the viewport is on the slide)
             if self.tldraw_whiteboard:
-                pos = Position(-self.pan.x * shapes_scale, -self.pan.y * shapes_scale)
+                pos_x = -self.pan.x * shapes_scale
+                pos_y = -self.pan.y * shapes_scale
             else:
-                pos = Position(
-                    self.page_size.width * -self.pan.x,
-                    self.page_size.height * -self.pan.y,
-                )
-
-            self.trans = Transform(padding, scale, size, pos, shapes_scale, shapes_size)
-            self.print_transform()
+                pos_x = page_width * -self.pan.x
+                pos_y = page_height * -self.pan.y
+
+            trans = Transform(
+                Size(padding_x, padding_y),
+                scale,
+                Size(width, height),
+                Position(pos_x, pos_y),
+                shapes_scale,
+                shapes_size,
+            )
+            # A pan/zoom that ends up with the same view doesn't need the slide
+            # to be rendered again.
+            if needs_render or trans != self.trans:
+                needs_render = True
+                self.trans = trans
+                self.print_transform()
 
         if needs_render:
-            # Render the transformed slide to a pattern
+            # Render the transformed slide to a pattern. The background is
+            # included, so the pattern covers the whole frame.
             ctx = self.ctx
             ctx.push_group()
+            ctx.set_source(self.background)
+            ctx.paint()
 
             if self.page:
                 if self.filetype is ImageType.IMAGE:
-                    assert isinstance(self.page, GdkPixbuf.Pixbuf)
+                    assert self.image_surface is not None
                     apply_slide_transform(ctx, self.trans)
-                    # Render on an opaque white background (transparent PNGs...)
-                    ctx.set_source_rgb(1, 1, 1)
-                    ctx.paint()
-                    Gdk.cairo_set_source_pixbuf(ctx, self.page, 0, 0)
+                    ctx.set_source_surface(self.image_surface, 0, 0)
                     ctx.paint()
                 elif self.filetype is ImageType.PDF:
                     self.render_pdf()
@@ -434,12 +578,17 @@ class PresentationRenderer(Generic[CairoSomeSurface]):
         return needs_render
 
     def render(self) -> None:
-        """Composite the last-updated presentation image"""
+        """Composite the last-updated presentation image
+
+        This replaces the entire frame, so it must be done first.
+        """
+        ctx = self.ctx
+        ctx.save()
         if self.pattern is not None:
-            ctx = self.ctx
-            ctx.save()
             ctx.set_source(self.pattern)
-            ctx.paint()
-            ctx.restore()
+            ctx.set_operator(cairo.OPERATOR_SOURCE)
         else:
-            print("No pattern to render!")
+            log.warning("No pattern to render!")
+            ctx.set_source(self.background)
+        ctx.paint()
+        ctx.restore()
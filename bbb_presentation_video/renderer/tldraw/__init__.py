@@ -4,14 +4,27 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, Generic, List, Optional, TypeVar, cast
+import logging
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    cast,
+)
 
+import attr
 import cairo
 from packaging.version import Version
-from sortedcollections import ValueSortedDict
 
 from bbb_presentation_video import events
-from bbb_presentation_video.events import Event, tldraw
+from bbb_presentation_video.events import tldraw
 from bbb_presentation_video.renderer.presentation import (
     Transform,
     apply_shapes_transform,
@@ -49,7 +62,9 @@ from bbb_presentation_video.renderer.tldraw.geo.triangle_geo_shape import (
 )
 from bbb_presentation_video.renderer.tldraw.geo.xbox_geo_shape import finalize_x_box
 from bbb_presentation_video.renderer.tldraw.shape import (
+    ArrowDecorations,
     ArrowGeoShape,
+    ArrowHandles,
     ArrowShape,
     ArrowShapeV2,
     CheckBoxGeoShape,
@@ -62,6 +77,7 @@ from bbb_presentation_video.renderer.tldraw.shape import (
     GroupShape,
     HexagonGeoShape,
     HighlighterShape,
+    LineHandles,
     LineShape,
     OvalGeoShape,
     PollShape,
@@ -95,9 +111,92 @@ from bbb_presentation_video.renderer.tldraw.shape.sticky_v2 import finalize_stic
 from bbb_presentation_video.renderer.tldraw.shape.text import finalize_text
 from bbb_presentation_video.renderer.tldraw.shape.text_v2 import finalize_v2_text
 from bbb_presentation_video.renderer.tldraw.shape.triangle import finalize_triangle
+from bbb_presentation_video.renderer.tldraw.utils import Style
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
+SHAPE_PATTERN_CACHE_SLIDES = 8
+"""Number of recently shown slides to keep the shape recordings of."""
+
+
+def finalize_group(
+    ctx: cairo.Context[cairo.RecordingSurface], id: str, shape: GroupShape
+) -> None:
+    # Nothing to do? All group-related updates seem to be propagated to the
+    # individual shapes in the group.
+    pass
+
+
+SHAPE_LAYOUT_ATTRIBUTES = frozenset(
+    ["id", "point", "childIndex", "parentId", "children"]
+)
+"""Shape attributes that don't change how the shape itself is drawn."""
+
+
+SHAPE_CONTENT_ATTRIBUTES: Dict[Type[Shape], Tuple[str, ...]] = {}
+"""Names of the attributes of each shape class that affect how it is drawn."""
+
+MUTABLE_SHAPE_ATTRIBUTE_TYPES = (Style, ArrowHandles, ArrowDecorations, LineHandles)
+"""Types of shape attributes which are updated in place, rather than replaced."""
+
+
+def shape_content(shape: Shape) -> List[Any]:
+    """Get the attributes of a shape that affect its drawing, other than position.
+
+    This is a shallow copy. The style and handles are updated in place, so they
+    are copied. Other values, like the list of freehand points, are replaced on
+    update rather than modified, so they are kept as-is and compared directly.
+    """
+    cls = type(shape)
+    names = SHAPE_CONTENT_ATTRIBUTES.get(cls)
+    if names is None:
+        names = SHAPE_CONTENT_ATTRIBUTES[cls] = tuple(
+            a.name for a in attr.fields(cls) if a.name not in SHAPE_LAYOUT_ATTRIBUTES
+        )
+    content = []
+    for name in names:
+        value = getattr(shape, name)
+        if isinstance(value, MUTABLE_SHAPE_ATTRIBUTE_TYPES):
+            value = attr.evolve(value)
+        content.append(value)
+    return content
+
+
+FINALIZE_SHAPE_FUNCS: Dict[
+    Type[Shape], Callable[[cairo.Context[cairo.RecordingSurface], str, Any], None]
+] = {
+    ArrowGeoShape: finalize_geo_arrow,
+    ArrowShape: finalize_arrow,
+    ArrowShapeV2: finalize_arrow_v2,
+    CheckBoxGeoShape: finalize_checkmark,
+    CloudGeoShape: finalize_cloud,
+    DiamondGeoShape: finalize_diamond,
+    DrawShape: finalize_draw,
+    EllipseShape: finalize_ellipse,
+    EllipseGeoShape: finalize_geo_ellipse,
+    GroupShape: finalize_group,
+    HexagonGeoShape: finalize_hexagon,
+    HighlighterShape: finalize_highlight,
+    LineShape: finalize_line,
+    OvalGeoShape: finalize_oval,
+    PollShape: finalize_poll,
+    RectangleShape: finalize_rectangle,
+    RectangleGeoShape: finalize_geo_rectangle,
+    RhombusGeoShape: finalize_rhombus,
+    StarGeoShape: finalize_star,
+    TrapezoidGeoShape: finalize_trapezoid,
+    TriangleShape: finalize_triangle,
+    TriangleGeoShape: finalize_geo_triangle,
+    TextShape: finalize_text,
+    TextShapeV2: finalize_v2_text,
+    StickyShape: lambda ctx, id, shape: finalize_sticky(ctx, shape),
+    StickyShapeV2: lambda ctx, id, shape: finalize_sticky_v2(ctx, shape),
+    XBoxGeoShape: finalize_x_box,
+}
+"""Functions to draw each type of shape (except frames, which need the renderer)."""
+
 
 class TldrawRenderer(Generic[CairoSomeSurface]):
     """Render tldraw whiteboard shapes"""
@@ -114,9 +213,15 @@ class TldrawRenderer(Generic[CairoSomeSurface]):
     presentation_slide: Dict[str, int]
     """The last shown slide on a given presentation."""
 
-    shapes: Dict[str, Dict[int, ValueSortedDict[str, Shape]]]
+    shapes: Dict[str, Dict[int, Dict[str, Shape]]]
     """The list of shapes, organized by presentation then slide."""
 
+    sorted_shapes: Dict[
+        Tuple[str, int], Tuple[List[Tuple[str, Shape]], Dict[str, List[Shape]]]
+    ]
+    """The shapes on a presentation and slide in drawing order, and the children of
+    each frame shape, built when needed."""
+
     shapes_changed: bool = False
     """Whether there have been changes to rendered shapes since the last frame."""
 
@@ -127,7 +232,12 @@ class TldrawRenderer(Generic[CairoSomeSurface]):
     """Cached rendered whiteboard."""
 
     shape_patterns: Dict[str, cairo.SurfacePattern]
-    """Cached rendered individual shapes for current presentation/slide."""
+    """Cached recordings of individual shapes for current presentation/slide.
+
+    These are independent of the transform, so they're kept when it changes."""
+
+    slide_shape_patterns: OrderedDict[Tuple[str, int], Dict[str, cairo.SurfacePattern]]
+    """Cached shape recordings of recently shown slides, least recently shown first."""
 
     bbb_version: Version
 
@@ -140,59 +250,115 @@ class TldrawRenderer(Generic[CairoSomeSurface]):
         self.ctx = ctx
         self.presentation_slide = {}
         self.shapes = {}
+        self.sorted_shapes = {}
         self.shape_patterns = {}
+        self.slide_shape_patterns = OrderedDict()
         self.transform = transform
         self.bbb_version = bbb_version
 
         add_fontconfig_app_font_dir()
 
-    def ensure_shape_structure(self, presentation: str, slide: int) -> None:
-        """Create the nested dict entries for storing shapes per presentation and slide."""
+    def ensure_shape_structure(self, presentation: str, slide: int) -> Dict[str, Shape]:
+        """Create the nested dict entries for storing shapes per presentation and slide.
+
+        :returns: The shapes on the presentation and slide.
+        """
         try:
             p = self.shapes[presentation]
         except KeyError:
             p = self.shapes[presentation] = {}
         try:
-            p[slide]
+            return p[slide]
         except KeyError:
-            p[slide] = ValueSortedDict(shape_sort_key)
+            slide_shapes: Dict[str, Shape] = {}
+            p[slide] = slide_shapes
+            return slide_shapes
+
+    def get_sorted_shapes(
+        self, presentation: str, slide: int
+    ) -> Tuple[List[Tuple[str, Shape]], Dict[str, List[Shape]]]:
+        """Get the shapes on a presentation and slide in drawing order.
+
+        :returns: The sorted shapes, and a map of frame shape ids to their children.
+
+        These are only recalculated after shapes are added or deleted, or when an
+        update changes a shape's position in the order or its parent.
+        """
+        key = (presentation, slide)
+        cached = self.sorted_shapes.get(key)
+        if cached is None:
+            sorted_shapes = sorted(
+                self.shapes[presentation][slide].items(),
+                key=lambda item: (shape_sort_key(item[1]), item[0]),
+            )
+            frame_map: Dict[str, List[Shape]] = {
+                id: [] for id, shape in sorted_shapes if isinstance(shape, FrameShape)
+            }
+            if frame_map:
+                for id, shape in sorted_shapes:
+                    children = frame_map.get(shape.parentId)
+                    if children is not None:
+                        shape.id = id
+                        children.append(shape)
+            cached = self.sorted_shapes[key] = (sorted_shapes, frame_map)
+        return cached
+
+    def show_slide_shape_patterns(self, presentation: str, slide: int) -> None:
+        """Switch the cached shape recordings to those of a presentation and slide.
+
+        Recordings are kept for a few recently shown slides, so flipping back and
+        forth between slides doesn't need all of their shapes to be redrawn.
+        """
+        key = (presentation, slide)
+        patterns = self.slide_shape_patterns.get(key)
+        if patterns is None:
+            patterns = self.slide_shape_patterns[key] = {}
+            if len(self.slide_shape_patterns) > SHAPE_PATTERN_CACHE_SLIDES:
+                self.slide_shape_patterns.popitem(last=False)
+        else:
+            self.slide_shape_patterns.move_to_end(key)
+        self.shape_patterns = patterns
+
+    def drop_shape_pattern(self, presentation: str, slide: int, id: str) -> None:
+        """Remove the cached recording of a shape, if there is one."""
+        patterns = self.slide_shape_patterns.get((presentation, slide))
+        if patterns is not None:
+            patterns.pop(id, None)
 
     def presentation_event(self, event: events.PresentationEvent) -> None:
         """Handler for PresentationEvent updates."""
         presentation = event["presentation"]
         if self.presentation == presentation:
-            print("\tTldraw: presentation did not change")
+            log.debug("\tTldraw: presentation did not change")
             return
 
-        # Only keep cached shape patterns for the current presentation/slide
-        self.shape_patterns.clear()
-
         self.presentation = presentation
         self.slide = self.presentation_slide.get(presentation, 0)
+        self.show_slide_shape_patterns(presentation, self.slide)
         self.shapes_changed = True
-        print(f"\tTldraw: presentation: {self.presentation}, slide: {self.slide}")
+        log.debug(
+            "\tTldraw: presentation: %s, slide: %s", self.presentation, self.slide
+        )
 
     def slide_event(self, event: events.SlideEvent) -> None:
         """Handler for SlideEvent updates."""
         presentation = self.presentation
         if presentation is None:
-            print(
-                f"\tTldraw: ignoring slide update since current presentation is not known"
+            log.debug(
+                "\tTldraw: ignoring slide update since current presentation is not known"
             )
             return
 
         slide = event["slide"]
         if self.slide == slide:
-            print("\tTldraw: slide did not change")
+            log.debug("\tTldraw: slide did not change")
             return
 
-        # Only keep cached shape patterns for the current presentation/slide
-        self.shape_patterns.clear()
-
         self.slide = slide
         self.presentation_slide[presentation] = slide
+        self.show_slide_shape_patterns(presentation, slide)
         self.shapes_changed = True
-        print(f"\tTldraw: presentation: {presentation}, slide: {slide}")
+        log.debug("\tTldraw: presentation: %s, slide: %s", presentation, slide)
 
     def add_shape_event(self, event: tldraw.AddShapeEvent) -> None:
         """Handler for tldraw AddShapeEvent updates."""
@@ -201,33 +367,48 @@ class TldrawRenderer(Generic[CairoSomeSurface]):
         id = event["id"]
         data = event["data"]
 
-        if "type" in data and data["type"] == "image":
-            print(f"\tTldraw: ignoring image shape type: {id}")
+        type = data.get("type")
+        if type == "image":
+            log.debug("\tTldraw: ignoring image shape type: %s", id)
             return
 
-        self.ensure_shape_structure(presentation, slide)
+        slide_shapes = self.ensure_shape_structure(presentation, slide)
 
-        if id in self.shapes[presentation][slide]:
-            shape = cast(Shape, self.shapes[presentation][slide][id])
+        shape = slide_shapes.get(id)
+        if shape is not None:
+            sort_key = shape_sort_key(shape)
+            parent_id = shape.parentId
+            content = shape_content(shape)
             shape.update_from_data(data)
+            if shape_sort_key(shape) != sort_key or shape.parentId != parent_id:
+                self.sorted_shapes.pop((presentation, slide), None)
+            # A shape that was only moved can reuse its recording
+            if shape_content(shape) == content:
+                self.shapes_changed = True
+                log.debug("\tTldraw: moved shape: %s", id)
+                return
             action = "updated"
         else:
-            if "type" in data:
-                shape = parse_shape_from_data(data, self.bbb_version)
-                self.shapes[presentation][slide][id] = shape
-                action = "added"
-            else:
-                print(f'\tTldraw: Got add for shape: {id} with missing "type" field')
+            if type is None:
+                log.warning(
+                    '\tTldraw: Got add for shape: %s with missing "type" field', id
+                )
                 return
+            shape = parse_shape_from_data(data, self.bbb_version)
+            slide_shapes[id] = shape
+            self.sorted_shapes.pop((presentation, slide), None)
+            action = "added"
 
-        try:
-            del self.shape_patterns[id]
-        except KeyError:
-            pass
+        self.drop_shape_pattern(presentation, slide, id)
 
         self.shapes_changed = True
-        print(
-            f"\tTldraw: {action} shape: {id}, presentation: {presentation}, slide: {slide}, {repr(shape)}"
+        log.debug(
+            "\tTldraw: %s shape: %s, presentation: %s, slide: %s, %r",
+            action,
+            id,
+            presentation,
+            slide,
+            shape,
         )
 
     def delete_shape_event(self, event: tldraw.DeleteShapeEvent) -> None:
@@ -235,33 +416,21 @@ class TldrawRenderer(Generic[CairoSomeSurface]):
         presentation = event["presentation"]
         slide = event["slide"]
 
-        try:
-            del self.shapes[presentation][slide][id]
-        except KeyError:
-            return
-        except ValueError:
+        slide_shapes = self.shapes.get(presentation, {}).get(slide)
+        if slide_shapes is None or slide_shapes.pop(id, None) is None:
             return
+        self.sorted_shapes.pop((presentation, slide), None)
 
-        try:
-            del self.shape_patterns[id]
-        except KeyError:
-            pass
+        self.drop_shape_pattern(presentation, slide, id)
 
         self.shapes_changed = True
-        print(
-            f"\tTldraw: deleted shape: {id}, presentation: {presentation}, slide: {slide}"
+        log.debug(
+            "\tTldraw: deleted shape: %s, presentation: %s, slide: %s",
+            id,
+            presentation,
+            slide,
         )
 
-    def update(self, event: Event) -> None:
-        if event["name"] == "presentation":
-            self.presentation_event(cast(events.PresentationEvent, event))
-        elif event["name"] == "slide":
-            self.slide_event(cast(events.SlideEvent, event))
-        elif event["name"] == "tldraw.add_shape":
-            self.add_shape_event(cast(tldraw.AddShapeEvent, event))
-        elif event["name"] == "tldraw.delete_shape":
-            self.delete_shape_event(cast(tldraw.DeleteShapeEvent, event))
-
     def finalize_shapes(
         self,
         ctx: cairo.Context[CairoSomeSurface],
@@ -269,85 +438,42 @@ class TldrawRenderer(Generic[CairoSomeSurface]):
         shape: Shape,
         frame_map: Dict[str, List[Shape]],
     ) -> None:
-        if id in self.shape_patterns and not id in frame_map:
-            print(f"\tTldraw: Cached {shape.__class__.__name__}: {id}")
+        pattern = self.shape_patterns.get(id)
+        if pattern is not None and not id in frame_map:
+            log.debug("\tTldraw: Cached %s: %s", shape.__class__.__name__, id)
         else:
-            ctx.push_group()
-            ctx.translate(*shape.point)
-            if isinstance(shape, ArrowGeoShape):
-                finalize_geo_arrow(ctx, id, shape)
-            elif isinstance(shape, ArrowShape):
-                finalize_arrow(ctx, id, shape)
-            elif isinstance(shape, ArrowShapeV2):
-                finalize_arrow_v2(ctx, id, shape)
-            elif isinstance(shape, CheckBoxGeoShape):
-                finalize_checkmark(ctx, id, shape)
-            elif isinstance(shape, CloudGeoShape):
-                finalize_cloud(ctx, id, shape)
-            elif isinstance(shape, DiamondGeoShape):
-                finalize_diamond(ctx, id, shape)
-            elif isinstance(shape, DrawShape):
-                finalize_draw(ctx, id, shape)
-            elif isinstance(shape, EllipseShape):
-                finalize_ellipse(ctx, id, shape)
-            elif isinstance(shape, EllipseGeoShape):
-                finalize_geo_ellipse(ctx, id, shape)
-            elif isinstance(shape, FrameShape):
+            # Record the shape relative to its position, so the recording can be
+            # replayed at any transform, and after the shape is moved.
+            recording = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, None)
+            shape_ctx = cairo.Context(recording)
+            shape_type = type(shape)
+            if shape_type is FrameShape:
                 finalize_frame(
                     self,
-                    ctx,
+                    shape_ctx,
                     id,
-                    shape,
+                    cast(FrameShape, shape),
                     frame_map,
                 )
-            elif isinstance(shape, GroupShape):
-                # Nothing to do? All group-related updates seem to be propagated to the
-                # individual shapes in the group.
-                pass
-            elif isinstance(shape, HexagonGeoShape):
-                finalize_hexagon(ctx, id, shape)
-            elif isinstance(shape, HighlighterShape):
-                finalize_highlight(ctx, id, shape)
-            elif isinstance(shape, LineShape):
-                finalize_line(ctx, id, shape)
-            elif isinstance(shape, OvalGeoShape):
-                finalize_oval(ctx, id, shape)
-            elif isinstance(shape, PollShape):
-                finalize_poll(ctx, id, shape)
-            elif isinstance(shape, RectangleShape):
-                finalize_rectangle(ctx, id, shape)
-            elif isinstance(shape, RectangleGeoShape):
-                finalize_geo_rectangle(ctx, id, shape)
-            elif isinstance(shape, RhombusGeoShape):
-                finalize_rhombus(ctx, id, shape)
-            elif isinstance(shape, StarGeoShape):
-                finalize_star(ctx, id, shape)
-            elif isinstance(shape, TrapezoidGeoShape):
-                finalize_trapezoid(ctx, id, shape)
-            elif isinstance(shape, TriangleShape):
-                finalize_triangle(ctx, id, shape)
-            elif isinstance(shape, TriangleGeoShape):
-                finalize_geo_triangle(ctx, id, shape)
-            elif isinstance(shape, TextShape):
-                finalize_text(ctx, id, shape)
-            elif isinstance(shape, TextShapeV2):
-                finalize_v2_text(ctx, id, shape)
-            elif isinstance(shape, StickyShape):
-                finalize_sticky(ctx, shape)
-            elif isinstance(shape, StickyShapeV2):
-                finalize_sticky_v2(ctx, shape)
-            elif isinstance(shape, XBoxGeoShape):
-                finalize_x_box(ctx, id, shape)
             else:
-                print(f"\tTldraw: Don't know how to render {shape}")
-
-            self.shape_patterns[id] = ctx.pop_group()
-
-        ctx.set_source(self.shape_patterns[id])
+                finalize = FINALIZE_SHAPE_FUNCS.get(shape_type)
+                if finalize is not None:
+                    finalize(shape_ctx, id, shape)
+                else:
+                    log.warning("\tTldraw: Don't know how to render %s", shape)
+
+            pattern = cairo.SurfacePattern(recording)
+            self.shape_patterns[id] = pattern
+
+        point = shape.point
+        pattern.set_matrix(cairo.Matrix(x0=-point.x, y0=-point.y))
+        ctx.set_source(pattern)
         ctx.paint()
 
     def finalize_frame(self, transform: Transform) -> bool:
-        transform_changed = self.transform != transform
+        transform_changed = self.transform is not transform and (
+            self.transform != transform
+        )
         if not self.shapes_changed and not transform_changed:
             return False
         self.transform = transform
@@ -362,45 +488,26 @@ class TldrawRenderer(Generic[CairoSomeSurface]):
             self.pattern = None
             return False
 
-        if transform_changed:
-            self.shape_patterns.clear()
-
-        shapes = self.shapes[presentation][slide]
-        print(f"\tTldraw: Rendering {len(shapes)} shapes.")
+        # Map of frame shapes to their children
+        shapes, frame_map = self.get_sorted_shapes(presentation, slide)
+        log.debug("\tTldraw: Rendering %s shapes.", len(shapes))
 
         ctx = self.ctx
         ctx.push_group()
 
         apply_shapes_transform(ctx, transform)
 
-        # Map to store frame shapes and their children
-        frame_map: Dict[str, List[Shape]] = {}
-
-        # First pass to identify frames and initialize them in the map
-        for id, s in shapes.items():
-            shape = cast(Shape, s)
-            if isinstance(s, FrameShape):
-                frame_map[id] = []
-
-        # Second pass to add children to frames
-        for id, s in shapes.items():
-            parent_id = s.parentId
-
-            # Check if the shape is in a frame
-            if parent_id in frame_map:
-                shape.id = id
-                frame_map[parent_id].append(s)
-
-        for id, s in shapes.items():
-            parent_id = s.parentId
-            shape = cast(Shape, s)
+        for id, shape in shapes:
+            if frame_map:
+                children = frame_map.get(id)
+                if children is not None:
+                    shape.children = children
 
-            if id in frame_map:
-                shape.children = frame_map[id]
+                # Frames are responsible for finalizing their children.
+                if shape.parentId in frame_map:
+                    continue
 
-            # Frames are responsible for finalizing their children.
-            if not parent_id in frame_map:
-                self.finalize_shapes(ctx, id, shape, frame_map)
+            self.finalize_shapes(ctx, id, shape, frame_map)
 
         self.pattern = ctx.pop_group()
         self.shapes_changed = False
@@ -3,12 +3,15 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import atexit
+import logging
 from contextlib import ExitStack
 from importlib import resources
 from os import path
 
 from bbb_presentation_video.bindings import fontconfig
 
+log = logging.getLogger(__name__)
+
 __fontconfig_app_font_dir_added = False
 
 
@@ -28,7 +31,7 @@ def add_fontconfig_app_font_dir() -> None:
 
     try:
         for dir in font_dirs:
-            print(dir)
+            log.debug("\tTldraw: adding font directory: %s", dir)
             fontconfig.app_font_add_dir(dir)
     except fontconfig.FontconfigError:
         stack.close()
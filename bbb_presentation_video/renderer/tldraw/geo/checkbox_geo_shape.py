@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from typing import List, TypeVar
 
 import cairo
@@ -27,6 +28,8 @@ from bbb_presentation_video.renderer.tldraw.utils import (
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def get_check_box_lines(w: float, h: float) -> List[List[List[float]]]:
     size = min(w, h) * 0.82
@@ -137,7 +140,7 @@ def dash_checkbox(
 def finalize_checkmark(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: CheckBoxGeoShape
 ) -> None:
-    print(f"\tTldraw: Finalizing checkmark: {id}")
+    log.debug("\tTldraw: Finalizing checkmark: %s", id)
 
     ctx.rotate(shape.rotation)
 
@@ -6,6 +6,7 @@
 
 from __future__ import annotations
 
+import logging
 import math
 from math import atan2, tau
 from random import Random
@@ -31,6 +32,8 @@ from bbb_presentation_video.renderer.tldraw.utils import (
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 @attr.s(auto_attribs=True, slots=True)
 class StraightPillSection:
@@ -419,7 +422,7 @@ def draw_cloud(
 def finalize_cloud(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: CloudGeoShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Cloud: {id}")
+    log.debug("\tTldraw: Finalizing Cloud: %s", id)
 
     ctx.rotate(shape.rotation)
 
@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from random import Random
 from typing import List, TypeVar
 
@@ -77,6 +78,8 @@ def diamond_stroke_points(id: str, shape: DiamondGeoShape) -> List[StrokePoint]:
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def draw_diamond(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: DiamondGeoShape
@@ -132,7 +135,7 @@ def dash_diamond(ctx: cairo.Context[CairoSomeSurface], shape: DiamondGeoShape) -
 def finalize_diamond(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: DiamondGeoShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Diamond: {id}")
+    log.debug("\tTldraw: Finalizing Diamond: %s", id)
 
     style = shape.style
 
@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from typing import List, TypeVar
 
 import cairo
@@ -48,6 +49,8 @@ def hexagon_stroke_points(id: str, shape: HexagonGeoShape) -> List[StrokePoint]:
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def draw_hexagon(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: HexagonGeoShape
@@ -97,7 +100,7 @@ def dash_hexagon(ctx: cairo.Context[CairoSomeSurface], shape: HexagonGeoShape) -
 def finalize_hexagon(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: HexagonGeoShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Hexagon: {id}")
+    log.debug("\tTldraw: Finalizing Hexagon: %s", id)
 
     style = shape.style
 
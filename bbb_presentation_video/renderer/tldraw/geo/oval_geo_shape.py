@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from math import cos, sin, tau
 from typing import List, TypeVar
 
@@ -16,6 +17,8 @@ from bbb_presentation_video.renderer.tldraw.utils import finalize_geo_path
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def oval_points(w: float, h: float, n_vertices: int = 25) -> List[Position]:
     cx = w / 2
@@ -58,7 +61,7 @@ def dash_oval(ctx: cairo.Context[CairoSomeSurface], shape: OvalGeoShape) -> None
 def finalize_oval(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: OvalGeoShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Oval: {id}")
+    log.debug("\tTldraw: Finalizing Oval: %s", id)
 
     ctx.rotate(shape.rotation)
 
@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from math import floor
 from random import Random
 from typing import List, Tuple, TypeVar, Union
@@ -102,6 +103,8 @@ def rectangle_stroke_points(
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def draw_rectangle(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: RectangleGeoShape
@@ -151,7 +154,7 @@ def dash_rectangle(
 def finalize_geo_rectangle(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: RectangleGeoShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Rectangle (geo): {id}")
+    log.debug("\tTldraw: Finalizing Rectangle (geo): %s", id)
 
     ctx.rotate(shape.rotation)
 
@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from random import Random
 from typing import List, TypeVar
 
@@ -76,6 +77,8 @@ def rhombus_stroke_points(id: str, shape: RhombusGeoShape) -> List[StrokePoint]:
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def draw_rhombus(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: RhombusGeoShape
@@ -129,7 +132,7 @@ def dash_rhombus(ctx: cairo.Context[CairoSomeSurface], shape: RhombusGeoShape) -
 def finalize_rhombus(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: RhombusGeoShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Rhombus: {id}")
+    log.debug("\tTldraw: Finalizing Rhombus: %s", id)
 
     style = shape.style
 
@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from math import cos, sin, tau
 from typing import List, TypeVar
 
@@ -78,6 +79,8 @@ def star_stroke_points(id: str, shape: StarGeoShape) -> List[StrokePoint]:
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def draw_star(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: StarGeoShape
@@ -125,7 +128,7 @@ def dash_star(ctx: cairo.Context[CairoSomeSurface], shape: StarGeoShape) -> None
 def finalize_star(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: StarGeoShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Star: {id}")
+    log.debug("\tTldraw: Finalizing Star: %s", id)
 
     style = shape.style
 
@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from typing import TypeVar
 
 import cairo
@@ -27,6 +28,8 @@ from bbb_presentation_video.renderer.tldraw.utils import (
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def overlay_x_cross(ctx: cairo.Context[CairoSomeSurface], shape: XBoxGeoShape) -> None:
     sw = STROKE_WIDTHS[shape.style.size]
@@ -109,7 +112,7 @@ def dash_x_box(ctx: cairo.Context[CairoSomeSurface], shape: XBoxGeoShape) -> Non
 def finalize_x_box(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: XBoxGeoShape
 ) -> None:
-    print(f"\tTldraw: Finalizing x-box: {id}")
+    log.debug("\tTldraw: Finalizing x-box: %s", id)
 
     ctx.rotate(shape.rotation)
 
@@ -13,6 +13,7 @@ from packaging.version import Version
 from bbb_presentation_video.events.helpers import Position, Size
 from bbb_presentation_video.events.tldraw import HandleData, ShapeData
 from bbb_presentation_video.renderer.tldraw.utils import (
+    ALIGN_STYLES,
     AlignStyle,
     Decoration,
     DrawPoints,
@@ -148,9 +149,9 @@ class LabelledShapeProto(RotatableShapeProto, Protocol):
             if "text" in props:
                 self.label = props["text"]
             if "align" in props:
-                self.align = AlignStyle(props["align"])
+                self.align = ALIGN_STYLES[props["align"]]
             if "verticalAlign" in props:
-                self.verticalAlign = AlignStyle(props["verticalAlign"])
+                self.verticalAlign = ALIGN_STYLES[props["verticalAlign"]]
             if "w" in props and "h" in props and "name" in props:
                 if not props["name"] == "":
                     self.label = props["name"]
@@ -418,9 +419,9 @@ class StickyShapeV2(RotatableShapeProto):
             if "text" in props:
                 self.text = props["text"]
             if "align" in props:
-                self.align = AlignStyle(props["align"])
+                self.align = ALIGN_STYLES[props["align"]]
             if "verticalAlign" in props:
-                self.verticalAlign = AlignStyle(props["verticalAlign"])
+                self.verticalAlign = ALIGN_STYLES[props["verticalAlign"]]
             if "growY" in props:
                 self.size = Size(self.size.width, self.size.height + props["growY"])
                 if props["growY"] != 0:
@@ -653,80 +654,69 @@ Shape = Union[
 ]
 
 
+SHAPE_TYPES: Dict[str, Type[Shape]] = {
+    "draw": DrawShape,
+    "rectangle": RectangleShape,
+    "ellipse": EllipseShape,
+    "triangle": TriangleShape,
+    "arrow": ArrowShape,
+    "text": TextShape,
+    "group": GroupShape,
+    "sticky": StickyShape,
+    "note": StickyShapeV2,
+    "line": LineShape,
+    "highlight": HighlighterShape,
+    "frame": FrameShape,
+    "poll": PollShape,
+}
+"""Shape classes by tldraw shape type."""
+
+SHAPE_TYPES_V2: Dict[str, Type[Shape]] = {
+    **SHAPE_TYPES,
+    "arrow": ArrowShapeV2,
+    "text": TextShapeV2,
+}
+"""Shape classes by tldraw shape type, for tldraw v2 (BigBlueButton 3.0+)."""
+
+GEO_SHAPE_TYPES: Dict[GeoShape, Type[Shape]] = {
+    GeoShape.DIAMOND: DiamondGeoShape,
+    GeoShape.ELLIPSE: EllipseGeoShape,
+    GeoShape.RECTANGLE: RectangleGeoShape,
+    GeoShape.TRIANGLE: TriangleGeoShape,
+    GeoShape.TRAPEZOID: TrapezoidGeoShape,
+    GeoShape.RHOMBUS: RhombusGeoShape,
+    GeoShape.HEXAGON: HexagonGeoShape,
+    GeoShape.CLOUD: CloudGeoShape,
+    GeoShape.STAR: StarGeoShape,
+    GeoShape.OVAL: OvalGeoShape,
+    GeoShape.CHECKBOX: CheckBoxGeoShape,
+    GeoShape.XBOX: XBoxGeoShape,
+    GeoShape.ARROW_DOWN: ArrowGeoShape,
+    GeoShape.ARROW_LEFT: ArrowGeoShape,
+    GeoShape.ARROW_RIGHT: ArrowGeoShape,
+    GeoShape.ARROW_UP: ArrowGeoShape,
+}
+"""Shape classes for the tldraw "geo" shape type, by geo type."""
+
+
 def parse_shape_from_data(data: ShapeData, bbb_version: Version) -> Shape:
     type = data["type"]
-    is_tldraw_v2 = bbb_version >= Version("3.0.0")
-
-    if type == "draw":
-        return DrawShape.from_data(data)
-    elif type == "rectangle":
-        return RectangleShape.from_data(data)
-    elif type == "ellipse":
-        return EllipseShape.from_data(data)
-    elif type == "triangle":
-        return TriangleShape.from_data(data)
-    elif type == "arrow":
-        if is_tldraw_v2:
-            return ArrowShapeV2.from_data(data)
-        else:
-            return ArrowShape.from_data(data)
-    elif type == "text":
-        if is_tldraw_v2:
-            return TextShapeV2.from_data(data)
-        else:
-            return TextShape.from_data(data)
-    elif type == "group":
-        return GroupShape.from_data(data)
-    elif type == "sticky":
-        return StickyShape.from_data(data)
-    elif type == "note":
-        return StickyShapeV2.from_data(data)
-    elif type == "line":
-        return LineShape.from_data(data)
-    elif type == "highlight":
-        return HighlighterShape.from_data(data)
-    elif type == "frame":
-        return FrameShape.from_data(data)
-    elif type == "poll":
-        return PollShape.from_data(data)
-    elif type == "geo":
+
+    if type == "geo":
+        geo_cls = None
         if "geo" in data["props"]:
-            geo_type = GeoShape(data["props"]["geo"])
-
-            if geo_type is GeoShape.DIAMOND:
-                return DiamondGeoShape.from_data(data)
-            if geo_type is GeoShape.ELLIPSE:
-                return EllipseGeoShape.from_data(data)
-            if geo_type is GeoShape.RECTANGLE:
-                return RectangleGeoShape.from_data(data)
-            if geo_type is GeoShape.TRIANGLE:
-                return TriangleGeoShape.from_data(data)
-            if geo_type is GeoShape.TRAPEZOID:
-                return TrapezoidGeoShape.from_data(data)
-            if geo_type is GeoShape.RHOMBUS:
-                return RhombusGeoShape.from_data(data)
-            if geo_type is GeoShape.HEXAGON:
-                return HexagonGeoShape.from_data(data)
-            if geo_type is GeoShape.CLOUD:
-                return CloudGeoShape.from_data(data)
-            if geo_type is GeoShape.STAR:
-                return StarGeoShape.from_data(data)
-            if geo_type is GeoShape.OVAL:
-                return OvalGeoShape.from_data(data)
-            if geo_type is GeoShape.CHECKBOX:
-                return CheckBoxGeoShape.from_data(data)
-            if geo_type is GeoShape.XBOX:
-                return XBoxGeoShape.from_data(data)
-            if geo_type in [
-                GeoShape.ARROW_DOWN,
-                GeoShape.ARROW_LEFT,
-                GeoShape.ARROW_RIGHT,
-                GeoShape.ARROW_UP,
-            ]:
-                return ArrowGeoShape.from_data(data)
-        raise Exception(f"Unknown geo shape: {type}")
+            geo_cls = GEO_SHAPE_TYPES.get(GeoShape(data["props"]["geo"]))
+        if geo_cls is None:
+            raise Exception(f"Unknown geo shape: {type}")
+        return geo_cls.from_data(data)
+
+    if bbb_version >= Version("3.0.0"):
+        cls = SHAPE_TYPES_V2.get(type)
     else:
+        cls = SHAPE_TYPES.get(type)
+    if cls is None:
         raise Exception(f"Unknown shape type: {type}")
+    return cls.from_data(data)
 
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
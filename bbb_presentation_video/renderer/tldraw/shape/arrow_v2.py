@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from typing import TypeVar
 
 import cairo
@@ -30,6 +31,8 @@ from bbb_presentation_video.renderer.tldraw.utils import (
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def straight_arrow(ctx: cairo.Context[CairoSomeSurface], shape: ArrowShapeV2) -> float:
     style = shape.style
@@ -159,7 +162,7 @@ def finalize_arrow_v2(
     id: str,
     shape: ArrowShapeV2,
 ) -> None:
-    print(f"\tTldraw: Finalizing Arrow (v2): {id}")
+    log.debug("\tTldraw: Finalizing Arrow (v2): %s", id)
 
     apply_shape_rotation(ctx, shape)
 
@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from math import tau
 from typing import Tuple, TypeVar, cast
 
@@ -29,11 +30,13 @@ from bbb_presentation_video.renderer.tldraw.utils import (
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def finalize_draw(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: DrawShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Draw: {id}")
+    log.debug("\tTldraw: Finalizing Draw: %s", id)
 
     apply_shape_rotation(ctx, shape)
 
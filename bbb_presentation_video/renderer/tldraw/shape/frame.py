@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from typing import TYPE_CHECKING, Any, Dict, List, TypeVar
 
 if TYPE_CHECKING:
@@ -18,6 +19,8 @@ from bbb_presentation_video.renderer.tldraw.utils import COLORS, STROKES, ColorS
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def dash_frame(
     self: TldrawRenderer[Any],
@@ -81,7 +84,7 @@ def finalize_frame(
     shape: FrameShape,
     frame_map: Dict[str, List[Shape]],
 ) -> None:
-    print(f"\tTldraw: Finalizing frame shape: {id}")
+    log.debug("\tTldraw: Finalizing frame shape: %s", id)
 
     ctx.rotate(shape.rotation)
     dash_frame(self, ctx, shape, frame_map)
@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from enum import Enum
 from math import floor
 from random import Random
@@ -32,6 +33,8 @@ from bbb_presentation_video.renderer.tldraw.utils import (
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def freehand_line_shaft(
     ctx: cairo.Context[CairoSomeSurface],
@@ -253,7 +256,7 @@ def curved_line(
 def finalize_line(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: LineShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Line: {id}")
+    log.debug("\tTldraw: Finalizing Line: %s", id)
 
     apply_shape_rotation(ctx, shape)
 
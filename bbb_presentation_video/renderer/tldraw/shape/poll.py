@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import logging
 from typing import TypeVar
 
 import cairo
@@ -25,11 +26,13 @@ POLL_HPADDING = 12.0
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def finalize_poll(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: PollShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Poll: {id}")
+    log.debug("\tTldraw: Finalizing Poll: %s", id)
 
     if len(shape.answers) == 0:
         return
@@ -69,7 +72,7 @@ def finalize_poll(
     max_percent_width = 0.0
     for answer in shape.answers:
         layout.set_text(answer.key, -1)
-        (label_width, _) = layout.get_pixel_size()
+        label_width, _ = layout.get_pixel_size()
         if label_width > max_label_width:
             max_label_width = label_width
         percent: str
@@ -80,7 +83,7 @@ def finalize_poll(
         else:
             percent = "0%"
         layout.set_text(percent, -1)
-        (percent_width, _) = layout.get_pixel_size()
+        percent_width, _ = layout.get_pixel_size()
         if percent_width > max_percent_width:
             max_percent_width = percent_width
 
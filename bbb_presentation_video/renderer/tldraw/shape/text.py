@@ -3,6 +3,7 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 from __future__ import annotations
 
+import logging
 from math import ceil
 from typing import Callable, Optional, Tuple, TypeVar
 
@@ -38,6 +39,8 @@ DPI: float = 72.0
 
 CairoSomeSurface = TypeVar("CairoSomeSurface", bound=cairo.Surface)
 
+log = logging.getLogger(__name__)
+
 
 def create_pango_layout(
     ctx: cairo.Context[CairoSomeSurface],
@@ -107,7 +110,9 @@ def show_layout_by_lines(
     # Assuming CSS "line-height: 1;" - i.e. line height = font size
     line_height = font.get_size() / Pango.SCALE
 
-    ctx.save()
+    # Only the transformation matrix is changed, so save and restore just that
+    # rather than the full context state.
+    matrix = ctx.get_matrix()
     ctx.translate(padding, padding)
     iter = layout.get_iter()
     while True:
@@ -130,19 +135,19 @@ def show_layout_by_lines(
         # half-leading value.
         offset_y = (-logical_y) + (line_height - logical_height) / 2
 
-        ctx.save()
+        line_matrix = ctx.get_matrix()
         ctx.translate(offset_x, offset_y)
         if do_path:
             PangoCairo.layout_line_path(ctx, line)
         else:
             PangoCairo.show_layout_line(ctx, line)
-        ctx.restore()
+        ctx.set_matrix(line_matrix)
 
         ctx.translate(0, line_height)
         if not iter.next_line():
             break
 
-    ctx.restore()
+    ctx.set_matrix(matrix)
 
 
 def get_layout_size(layout: Pango.Layout, *, padding: float = 0) -> Size:
@@ -160,7 +165,7 @@ def get_layout_size(layout: Pango.Layout, *, padding: float = 0) -> Size:
 def finalize_text(
     ctx: cairo.Context[CairoSomeSurface], id: str, shape: TextShape
 ) -> None:
-    print(f"\tTldraw: Finalizing Text: {id}")
+    log.debug("\tTldraw: Finalizing Text: %s", id)
 
     apply_shape_rotation(ctx, shape)
 
@@ -185,7 +190,7 @@ def finalize_label(
     if shape.label is None or shape.label == "":
         return (Size(16, 32), 1)
 
-    print(f"\t\tFinalizing Label")
+    log.debug("\t\tFinalizing Label")
 
     style = shape.style
     # Label text is always centered
@@ -231,7 +236,7 @@ def finalize_sticky_text(
     if shape.text is None or shape.text == "":
         return
 
-    print(f"\t\tFinalizing Sticky Text")
+    log.debug("\t\tFinalizing Sticky Text")
 
     style = shape.style
     font_size = STICKY_FONT_SIZES[style.size]
@@ -296,6 +296,16 @@ class FillStyle(Enum):
     PATTERN: str = "pattern"
 
 
+# Style enum members by value. Looking these up directly is cheaper than calling
+# the enum class, and shape styles are parsed on every shape update.
+COLOR_STYLES: Dict[str, ColorStyle] = {style.value: style for style in ColorStyle}
+SIZE_STYLES: Dict[str, SizeStyle] = {style.value: style for style in SizeStyle}
+DASH_STYLES: Dict[str, DashStyle] = {style.value: style for style in DashStyle}
+FONT_STYLES: Dict[str, FontStyle] = {style.value: style for style in FontStyle}
+ALIGN_STYLES: Dict[str, AlignStyle] = {style.value: style for style in AlignStyle}
+FILL_STYLES: Dict[str, FillStyle] = {style.value: style for style in FillStyle}
+
+
 @attr.s(order=False, slots=True, auto_attribs=True)
 class Style:
     color: ColorStyle = ColorStyle.BLACK
@@ -311,19 +321,19 @@ class Style:
 
     def update_from_data(self, data: StyleData) -> None:
         if "color" in data:
-            self.color = ColorStyle(data["color"])
+            self.color = COLOR_STYLES[data["color"]]
         if "size" in data:
-            self.size = SizeStyle(data["size"])
+            self.size = SIZE_STYLES[data["size"]]
         if "dash" in data:
-            self.dash = DashStyle(data["dash"])
+            self.dash = DASH_STYLES[data["dash"]]
         if "isFilled" in data:
             self.isFilled = data["isFilled"]
         if "scale" in data:
             self.scale = data["scale"]
         if "font" in data:
-            self.font = FontStyle(data["font"])
+            self.font = FONT_STYLES[data["font"]]
         if "textAlign" in data:
-            self.textAlign = AlignStyle(data["textAlign"])
+            self.textAlign = ALIGN_STYLES[data["textAlign"]]
         if "opacity" in data:
             self.opacity = data["opacity"]
 
@@ -331,7 +341,7 @@ class Style:
         if "isClosed" in data:
             self.isClosed = data["isClosed"]
         if "fill" in data:
-            self.fill = FillStyle(data["fill"])
+            self.fill = FILL_STYLES[data["fill"]]
             if self.fill is not FillStyle.NONE:
                 self.isFilled = True
 
@@ -390,9 +400,9 @@ def circle_from_three_points(
     A: Sequence[float], B: Sequence[float], C: Sequence[float]
 ) -> Tuple[Position, float]:
     """Get a circle from three points."""
-    (x1, y1) = A
-    (x2, y2) = B
-    (x3, y3) = C
+    x1, y1 = A
+    x2, y2 = B
+    x3, y3 = C
 
     a = x1 * (y2 - y3) - y1 * (x2 - x3) + x2 * y3 - x3 * y2
 
@@ -538,30 +548,50 @@ def draw_smooth_path(
     if len(points) < 1:
         return
 
-    prev_point = points[0]
+    # Cairo can't render quadratic curves directly, need to convert to cubic curves.
+    # This is the same math as vec.med and bezier_quad_to_cube, done inline on floats
+    # since it runs for every point of every freehand line.
+    two_thirds = 2 / 3
+    curve_to = ctx.curve_to
+
+    prev_x, prev_y = points[0][0], points[0][1]
     if closed:
-        prev_mid = vec.med(points[-1], prev_point)
+        last = points[-1]
+        prev_mid_x = (last[0] + prev_x) * 0.5
+        prev_mid_y = (last[1] + prev_y) * 0.5
     else:
-        prev_mid = prev_point
-    ctx.move_to(prev_mid[0], prev_mid[1])
+        prev_mid_x, prev_mid_y = prev_x, prev_y
+    ctx.move_to(prev_mid_x, prev_mid_y)
     for point in points[1:]:
-        mid = vec.med(prev_point, point)
-
-        # Cairo can't render quadratic curves directly, need to convert to cubic curves.
-        cp1, cp2 = bezier_quad_to_cube(prev_mid, prev_point, mid)
-        ctx.curve_to(cp1[0], cp1[1], cp2[0], cp2[1], mid[0], mid[1])
-        prev_point = point
-        prev_mid = mid
+        x, y = point[0], point[1]
+        mid_x = (prev_x + x) * 0.5
+        mid_y = (prev_y + y) * 0.5
+        curve_to(
+            prev_mid_x + (prev_x - prev_mid_x) * two_thirds,
+            prev_mid_y + (prev_y - prev_mid_y) * two_thirds,
+            mid_x + (prev_x - mid_x) * two_thirds,
+            mid_y + (prev_y - mid_y) * two_thirds,
+            mid_x,
+            mid_y,
+        )
+        prev_x, prev_y = x, y
+        prev_mid_x, prev_mid_y = mid_x, mid_y
 
     if closed:
-        point = points[0]
-        mid = vec.med(prev_point, point)
+        first = points[0]
+        mid_x = (prev_x + first[0]) * 0.5
+        mid_y = (prev_y + first[1]) * 0.5
     else:
-        point = points[-1]
-        mid = point
-
-    cp1, cp2 = bezier_quad_to_cube(prev_mid, prev_point, mid)
-    ctx.curve_to(cp1[0], cp1[1], cp2[0], cp2[1], mid[0], mid[1])
+        mid_x, mid_y = points[-1][0], points[-1][1]
+
+    curve_to(
+        prev_mid_x + (prev_x - prev_mid_x) * two_thirds,
+        prev_mid_y + (prev_y - prev_mid_y) * two_thirds,
+        mid_x + (prev_x - mid_x) * two_thirds,
+        mid_y + (prev_y - mid_y) * two_thirds,
+        mid_x,
+        mid_y,
+    )
 
     if closed:
         ctx.close_path()
@@ -572,7 +602,7 @@ def draw_smooth_stroke_point_path(
     points: Sequence[perfect_freehand.types.StrokePoint],
     closed: bool = True,
 ) -> None:
-    outline_points = list(map(lambda p: p["point"], points))
+    outline_points = [p["point"] for p in points]
     draw_smooth_path(ctx, outline_points, closed)
 
 
@@ -3,8 +3,9 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 from __future__ import annotations
 
+import logging
 from collections import deque
-from typing import Deque, Dict, Generic, Optional, TypeVar
+from typing import Callable, Deque, Dict, Generic, Optional, TypeVar
 
 import cairo
 import gi
@@ -23,13 +24,15 @@ from bbb_presentation_video.events import (
     SlideEvent,
     UndoEvent,
 )
-from bbb_presentation_video.events.helpers import Color, Position
+from bbb_presentation_video.events.helpers import Color
 from bbb_presentation_video.renderer.presentation import (
     Transform,
     apply_shapes_transform,
 )
 from bbb_presentation_video.renderer.utils import cairo_draw_ellipse
 
+log = logging.getLogger(__name__)
+
 FONT_FAMILY = "Arial"
 
 POLL_BAR_COLOR = Color.from_int(0x333333)
@@ -57,6 +60,12 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
 
     shapes_changed: bool
 
+    font_descriptions: Dict[int, Pango.FontDescription]
+    text_pctx: Optional[Pango.Context]
+    poll_pctx: Optional[Pango.Context]
+
+    draw_shape_funcs: Dict[str, Callable[[ShapeEvent], None]]
+
     def __init__(self, ctx: cairo.Context[CairoSomeSurface], transform: Transform):
         self.ctx = ctx
 
@@ -71,26 +80,75 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
 
         self.shapes_changed = False
 
+        # Pango objects are reused between shapes and frames
+        self.font_descriptions = {}
+        self.text_pctx = None
+        self.poll_pctx = None
+
+        # Draw function for each shape type
+        self.draw_shape_funcs = {
+            "pencil": self.draw_pencil,
+            "rectangle": self.draw_rectangle,
+            "ellipse": self.draw_ellipse,
+            "triangle": self.draw_triangle,
+            "line": self.draw_line,
+            "text": self.draw_text,
+            "poll_result": self.draw_poll_result,
+        }
+
+    def font_description(self, size: int) -> Pango.FontDescription:
+        """Get a font description for the given absolute size in Pango units."""
+        font = self.font_descriptions.get(size)
+        if font is None:
+            font = Pango.FontDescription()
+            font.set_family(FONT_FAMILY)
+            font.set_absolute_size(size)
+            self.font_descriptions[size] = font
+        return font
+
+    def text_pango_context(self) -> Pango.Context:
+        """Get the Pango context for text shapes, updated to the current transform."""
+        pctx = self.text_pctx
+        if pctx is None:
+            pctx = self.text_pctx = PangoCairo.create_context(self.ctx)
+            fo = cairo.FontOptions()
+            fo.set_antialias(cairo.ANTIALIAS_GRAY)
+            fo.set_hint_metrics(cairo.HINT_METRICS_ON)
+            fo.set_hint_style(cairo.HINT_STYLE_NONE)
+            PangoCairo.context_set_font_options(pctx, fo)
+        else:
+            PangoCairo.update_context(self.ctx, pctx)
+        return pctx
+
+    def poll_pango_context(self) -> Pango.Context:
+        """Get the Pango context for poll results, updated to the current transform."""
+        pctx = self.poll_pctx
+        if pctx is None:
+            pctx = self.poll_pctx = PangoCairo.create_context(self.ctx)
+        else:
+            PangoCairo.update_context(self.ctx, pctx)
+        return pctx
+
     def update_presentation(self, event: PresentationEvent) -> None:
         if self.presentation == event["presentation"]:
-            print("\tShapes: presentation did not change")
+            log.debug("\tShapes: presentation did not change")
             return
         self.presentation = event["presentation"]
         self.shapes_changed = True
         # Restore the last viewed page from this presentation
         self.slide = self.presentation_slide.get(self.presentation, 0)
-        print(f"\tShapes: presentation: {self.presentation}")
-        print(f"\tShapes: slide: {self.slide}")
+        log.debug("\tShapes: presentation: %s", self.presentation)
+        log.debug("\tShapes: slide: %s", self.slide)
 
     def update_slide(self, event: SlideEvent) -> None:
         if self.slide == event["slide"]:
-            print("\tShapes: slide did not change")
+            log.debug("\tShapes: slide did not change")
             return
         self.slide = event["slide"]
         if self.presentation is not None:
             self.presentation_slide[self.presentation] = self.slide
         self.shapes_changed = True
-        print(f"\tShapes: slide: {self.slide}")
+        log.debug("\tShapes: slide: %s", self.slide)
 
     def ensure_shapes_structure(self, presentation: str, slide: int) -> None:
         if not presentation in self.shapes:
@@ -113,8 +171,9 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
             and event["shape_type"] == "text"
             and event["shape_status"] == ShapeStatus.DRAW_END
         ):
-            print(
-                f"\tShapes: ignoring textPublished event without page info for {event['shape_id']}"
+            log.debug(
+                "\tShapes: ignoring textPublished event without page info for %s",
+                event["shape_id"],
             )
             return
 
@@ -131,8 +190,10 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
                 None,
             )
             if prev_index is not None:
-                print(
-                    f"\tShapes: replacing shape with same id {event['shape_id']} at index {prev_index}"
+                log.debug(
+                    "\tShapes: replacing shape with same id %s at index %s",
+                    event["shape_id"],
+                    prev_index,
                 )
         else:
             # Horrible hack to support old recordings
@@ -143,8 +204,10 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
                     and prev_shape["shape_type"] == event["shape_type"]
                 ):
                     prev_index = -1
-                    print(
-                        f"\tShapes: replacing shape with same initial point {event['points'][0]} at index {prev_index}"
+                    log.debug(
+                        "\tShapes: replacing shape with same initial point %s at index %s",
+                        event["points"][0],
+                        prev_index,
                     )
 
         if prev_index is not None:
@@ -162,9 +225,13 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
             self.shapes[presentation][slide][prev_index] = event
         else:
             self.shapes[presentation][slide].append(event)
-        print(
-            f"\tShapes: add {event['shape_type']} id: {event['shape_id']} "
-            f"presentation: {presentation} slide: {slide} points: {event['points']}"
+        log.debug(
+            "\tShapes: add %s id: %s presentation: %s slide: %s points: %s",
+            event["shape_type"],
+            event["shape_id"],
+            presentation,
+            slide,
+            event["points"],
         )
         self.shapes_changed = True
 
@@ -189,15 +256,15 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
                 ]
             )
             self.shapes_changed = True
-            print(f"\tShapes: undo removed id: {shape_id}")
+            log.debug("\tShapes: undo removed id: %s", shape_id)
 
         # Undo without a shape id just removes the most recently added shape
         else:
             if len(self.shapes[presentation][slide]) > 0:
                 shape = self.shapes[presentation][slide].pop()
                 self.shapes_changed = True
-                print(
-                    f"\tShapes: undo removed last added shape, id: {shape['shape_id']}"
+                log.debug(
+                    "\tShapes: undo removed last added shape, id: %s", shape["shape_id"]
                 )
 
     def update_clear(self, event: ClearEvent) -> None:
@@ -215,7 +282,7 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
         if event.get("full_clear", True):
             self.shapes[presentation][slide] = deque()
             self.shapes_changed = True
-            print("\tShapes: cleared all shapes")
+            log.debug("\tShapes: cleared all shapes")
 
         # Otherwise we have to remove only shapes for a specific user
         else:
@@ -227,7 +294,7 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
                 ]
             )
             self.shapes_changed = True
-            print(f"\tShapes: cleared shapes for user {event['user_id']}")
+            log.debug("\tShapes: cleared shapes for user %s", event["user_id"])
 
     def shape_thickness(self, shape: ShapeEvent) -> float:
         thickness_ratio = shape.get("thickness_ratio")
@@ -246,78 +313,62 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
         ctx.set_line_cap(cairo.LINE_CAP_ROUND)
         ctx.set_line_join(cairo.LINE_JOIN_ROUND)
 
+        # Build the path from the slide-relative points and let cairo scale it
+        # to the slide size. The matrix is restored before stroking, so the
+        # (non-uniform) scale doesn't distort the line width.
         size = self.transform.shapes_size
+        points = [(point.x, point.y) for point in shape["points"]]
+        ctx.save()
+        ctx.scale(size.width, size.height)
 
         # The shape has commands, allowing curved lines
-        if (
-            "commands" in shape
-            and shape["commands"] is not None
-            and len(shape["points"]) > 1
-        ):
+        if "commands" in shape and shape["commands"] is not None and len(points) > 1:
+            points_iter = iter(points)
+            prev_x, prev_y = points[0]
+            # A StopIteration here means the commands refer to more points than
+            # are present; draw as much of the shape as possible.
             try:
-                commands_iter = iter(shape["commands"])
-                points_iter = iter(shape["points"])
-                prev_point = shape["points"][0]
-                while True:
-                    command = next(commands_iter)
+                for command in shape["commands"]:
                     if command is PencilCommand.MOVE_TO:
-                        point = next(points_iter)
-                        ctx.move_to(point.x * size.width, point.y * size.height)
+                        x, y = next(points_iter)
+                        ctx.move_to(x, y)
                     elif command is PencilCommand.LINE_TO:
-                        point = next(points_iter)
-                        ctx.line_to(point.x * size.width, point.y * size.height)
+                        x, y = next(points_iter)
+                        ctx.line_to(x, y)
                     elif command is PencilCommand.Q_CURVE_TO:
-                        qc = next(points_iter)
-                        point = next(points_iter)
+                        qc_x, qc_y = next(points_iter)
+                        x, y = next(points_iter)
                         # Cairo only has cubic curves, so we have to convert
-                        cc1 = Position(
-                            prev_point.x + (qc.x - prev_point.x) * 2 / 3,
-                            prev_point.y + (qc.y - prev_point.y) * 2 / 3,
-                        )
-                        cc2 = Position(
-                            point.x + (qc.x - point.x) * 2 / 3,
-                            point.y + (qc.y - point.y) * 2 / 3,
-                        )
                         ctx.curve_to(
-                            cc1.x * size.width,
-                            cc1.y * size.height,
-                            cc2.x * size.width,
-                            cc2.y * size.height,
-                            point.x * size.width,
-                            point.y * size.height,
+                            prev_x + (qc_x - prev_x) * 2 / 3,
+                            prev_y + (qc_y - prev_y) * 2 / 3,
+                            x + (qc_x - x) * 2 / 3,
+                            y + (qc_y - y) * 2 / 3,
+                            x,
+                            y,
                         )
                     elif command is PencilCommand.C_CURVE_TO:
-                        c1 = next(points_iter)
-                        c2 = next(points_iter)
-                        point = next(points_iter)
-                        ctx.curve_to(
-                            c1.x * size.width,
-                            c1.y * size.height,
-                            c2.x * size.width,
-                            c2.y * size.height,
-                            point.x * size.width,
-                            point.y * size.height,
-                        )
+                        c1_x, c1_y = next(points_iter)
+                        c2_x, c2_y = next(points_iter)
+                        x, y = next(points_iter)
+                        ctx.curve_to(c1_x, c1_y, c2_x, c2_y, x, y)
                     else:
-                        print(f"\tShapes: Unknown command in pencil: {command}")
-                    prev_point = point
+                        log.debug("\tShapes: Unknown command in pencil: %s", command)
+                    prev_x, prev_y = x, y
             except StopIteration:
                 pass
-            ctx.stroke()
 
         # Simple line
         else:
-            print(f"Points: {shape['points']!r}")
-            point = shape["points"][0]
-            ctx.move_to(point.x * size.width, point.y * size.height)
-            try:
-                points_iter = iter(shape["points"])
-                while True:
-                    point = next(points_iter)
-                    ctx.line_to(point.x * size.width, point.y * size.height)
-            except StopIteration:
-                pass
-            ctx.stroke()
+            x, y = points[0]
+            ctx.move_to(x, y)
+            # Includes a segment to the first point, so that a pencil shape with
+            # only one point is drawn as a dot.
+            for x, y in points:
+                ctx.line_to(x, y)
+
+        ctx.restore()
+        ctx.stroke()
 
     def draw_rectangle(self, shape: ShapeEvent) -> None:
         ctx = self.ctx
@@ -434,22 +485,14 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
         rect_width = shape["width"] * size.width
         rect_height = shape["height"] * size.height
 
-        font = Pango.FontDescription()
-        font.set_family(FONT_FAMILY)
         font_size = shape["calced_font_size"] * size.height
-        font.set_absolute_size(int(font_size * Pango.SCALE))
+        font = self.font_description(int(font_size * Pango.SCALE))
 
         ctx = self.ctx
         ctx.set_source_rgb(*shape["font_color"])
         ctx.translate(x * size.width, y * size.height)
 
-        pctx = PangoCairo.create_context(ctx)
-        fo = cairo.FontOptions()
-        fo.set_antialias(cairo.ANTIALIAS_GRAY)
-        fo.set_hint_metrics(cairo.HINT_METRICS_ON)
-        fo.set_hint_style(cairo.HINT_STYLE_NONE)
-        PangoCairo.context_set_font_options(pctx, fo)
-        layout = Pango.Layout(pctx)
+        layout = Pango.Layout(self.text_pango_context())
         layout.set_font_description(font)
         layout.set_width(int(rect_width * Pango.SCALE))
         # The font size stuff is so iffy that I don't want to clip, let it
@@ -490,33 +533,31 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
         ctx.set_source_rgb(*POLL_FG)
         ctx.stroke()
 
-        font = Pango.FontDescription()
-        font.set_family(FONT_FAMILY)
-        font.set_absolute_size(int(POLL_FONT_SIZE * Pango.SCALE))
+        font = self.font_description(int(POLL_FONT_SIZE * Pango.SCALE))
 
         # Use Pango to calculate the label width space needed
-        pctx = PangoCairo.create_context(ctx)
-        layout = Pango.Layout(pctx)
+        layout = Pango.Layout(self.poll_pango_context())
         layout.set_font_description(font)
 
+        # Calculate the vote ratio and percentage label for each result once
+        results = shape["result"]
+        num_responders = shape["num_responders"]
+        if num_responders > 0:
+            ratios = [
+                float(result["num_votes"]) / float(num_responders) for result in results
+            ]
+        else:
+            ratios = [0.0] * len(results)
+        percents = [f"{int(ratio * 100)}%" for ratio in ratios]
+
         max_label_width = 0.0
         max_percent_width = 0.0
-        for result in shape["result"]:
+        for result, percent in zip(results, percents):
             layout.set_text(result["key"], -1)
             (label_width, _) = layout.get_pixel_size()
             if label_width > max_label_width:
                 max_label_width = label_width
-            if shape["num_responders"] > 0:
-                result["percent"] = "{}%".format(
-                    int(
-                        float(result["num_votes"])
-                        / float(shape["num_responders"])
-                        * 100
-                    )
-                )
-            else:
-                result["percent"] = "0%"
-            layout.set_text(result["percent"], -1)
+            layout.set_text(percent, -1)
             (percent_width, _) = layout.get_pixel_size()
             if percent_width > max_percent_width:
                 max_percent_width = percent_width
@@ -524,20 +565,15 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
         max_label_width = min(max_label_width, width * 0.3)
         max_percent_width = min(max_percent_width, width * 0.3)
 
-        bar_height = (height - POLL_VPADDING) / len(shape["result"]) - POLL_VPADDING
+        bar_height = (height - POLL_VPADDING) / len(results) - POLL_VPADDING
         bar_width = width - 4 * POLL_HPADDING - max_label_width - max_percent_width
         bar_x = x + 2 * POLL_HPADDING + max_label_width
 
         # All sizes are calculated, so draw the poll
-        for i, result in enumerate(shape["result"]):
+        for i, (result, result_ratio, percent) in enumerate(
+            zip(results, ratios, percents)
+        ):
             bar_y = y + (bar_height + POLL_VPADDING) * i + POLL_VPADDING
-            if shape["num_responders"] > 0:
-                result_ratio = float(result["num_votes"]) / float(
-                    shape["num_responders"]
-                )
-            else:
-                result_ratio = 0.0
-
             bar_x2 = bar_x + (bar_width * result_ratio)
 
             # Draw the bar
@@ -565,7 +601,7 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
             )
             PangoCairo.show_layout(ctx, layout)
             layout.set_width(int(max_percent_width * Pango.SCALE))
-            layout.set_text(result["percent"], -1)
+            layout.set_text(percent, -1)
             percent_width, percent_height = layout.get_pixel_size()
             ctx.move_to(
                 x + width - POLL_HPADDING - percent_width,
@@ -596,7 +632,11 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
 
     def finalize_frame(self, transform: Transform) -> bool:
         try:
-            if not self.shapes_changed and self.transform == transform:
+            # A new Transform is only created when the presentation renderer
+            # updates the slide position, so check identity before values.
+            if not self.shapes_changed and (
+                self.transform is transform or self.transform == transform
+            ):
                 return False
             self.transform = transform
 
@@ -606,39 +646,30 @@ class ShapesRenderer(Generic[CairoSomeSurface]):
                 or not self.slide in self.shapes[self.presentation]
             ):
                 if self.pattern:
-                    print("\tShapes: no shapes to render")
+                    log.debug("\tShapes: no shapes to render")
                     self.pattern = None
                     return True
                 else:
                     return False
 
-            print(
-                f"\tShapes: rendering {len(self.shapes[self.presentation][self.slide])} shapes"
+            log.debug(
+                "\tShapes: rendering %s shapes",
+                len(self.shapes[self.presentation][self.slide]),
             )
 
             ctx = self.ctx
             ctx.push_group()
             apply_shapes_transform(ctx, self.transform)
 
+            draw_shape_funcs = self.draw_shape_funcs
             for shape in self.shapes[self.presentation][self.slide]:
-                ctx.save()
                 type = shape["shape_type"]
-                if type == "pencil":
-                    self.draw_pencil(shape)
-                elif type == "rectangle":
-                    self.draw_rectangle(shape)
-                elif type == "ellipse":
-                    self.draw_ellipse(shape)
-                elif type == "triangle":
-                    self.draw_triangle(shape)
-                elif type == "line":
-                    self.draw_line(shape)
-                elif type == "text":
-                    self.draw_text(shape)
-                elif type == "poll_result":
-                    self.draw_poll_result(shape)
-                else:
-                    print(f"\tShapes: don't know how to draw {type}")
+                draw_shape = draw_shape_funcs.get(type)
+                if draw_shape is None:
+                    log.debug("\tShapes: don't know how to draw %s", type)
+                    continue
+                ctx.save()
+                draw_shape(shape)
                 ctx.restore()
 
             self.pattern = ctx.pop_group()
@@ -0,0 +1,175 @@
+import os
+import stat
+from collections import deque
+from fractions import Fraction
+from pathlib import Path
+from typing import Deque, List
+
+import pytest
+from packaging.version import Version
+
+from bbb_presentation_video.events import Event, EventsInfo, RecordEvent
+from bbb_presentation_video.renderer import (
+    Codec,
+    render_section,
+    section_frame_bounds,
+    write_concat_list,
+)
+
+WIDTH = 32
+HEIGHT = 24
+FRAME_BYTES = WIDTH * HEIGHT * 4
+
+# Stand-in for ffmpeg which saves the raw frames it is sent to the output file
+FAKE_FFMPEG = """#!/bin/sh
+for arg; do output="$arg"; done
+exec cat > "$output"
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    ffmpeg = bin_dir / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+def make_events(record_start: Fraction, length: Fraction) -> EventsInfo:
+    record: RecordEvent = {"name": "record", "timestamp": record_start, "status": True}
+    events: Deque[Event] = deque([record])
+    return EventsInfo(
+        bbb_version=Version("2.6.0"),
+        events=events,
+        length=length,
+        hide_logo=True,
+        tldraw_whiteboard=True,
+    )
+
+
+def test_section_frame_bounds() -> None:
+    assert section_frame_bounds(0, 10, 1) == [0, 10]
+    assert section_frame_bounds(0, 10, 3) == [0, 3, 6, 10]
+    assert section_frame_bounds(5, 15, 2) == [5, 10, 15]
+
+
+def test_section_frame_bounds_more_jobs_than_frames() -> None:
+    # Empty sections are dropped
+    assert section_frame_bounds(0, 2, 4) == [0, 1, 2]
+
+
+def test_write_concat_list(tmp_path: Path) -> None:
+    concat_list = tmp_path / "concat.txt"
+    section_outputs = [str(tmp_path / f"section-{i:d}.mkv") for i in range(3)]
+    write_concat_list(str(concat_list), section_outputs, [10, 0, 5], Fraction(10))
+
+    lines: List[str] = concat_list.read_text().splitlines()
+    assert lines == [
+        "file 'section-0.mkv'",
+        "duration 1.000000",
+        "file 'section-2.mkv'",
+        "duration 0.500000",
+    ]
+
+
+def test_write_concat_list_quote_in_path(tmp_path: Path) -> None:
+    # The sections are listed relative to the script, so a quote in the
+    # directory doesn't matter; one in the file name is escaped.
+    section_dir = tmp_path / "it's"
+    section_dir.mkdir()
+    concat_list = section_dir / "concat.txt"
+    section_outputs = [
+        str(section_dir / "section-0.mkv"),
+        str(section_dir / "it's.mkv"),
+    ]
+    write_concat_list(str(concat_list), section_outputs, [10, 10], Fraction(10))
+
+    assert concat_list.read_text().splitlines() == [
+        "file 'section-0.mkv'",
+        "duration 1.000000",
+        "file 'it'\\''s.mkv'",
+        "duration 1.000000",
+    ]
+
+
+def test_write_concat_list_fractional_framerate(tmp_path: Path) -> None:
+    concat_list = tmp_path / "concat.txt"
+    write_concat_list(
+        str(concat_list), ["section-0.mkv"], [1001], Fraction(30000, 1001)
+    )
+
+    assert concat_list.read_text().splitlines() == [
+        "file 'section-0.mkv'",
+        "duration 33.400033",
+    ]
+
+
+def test_render_frame_count(tmp_path: Path, fake_ffmpeg: None) -> None:
+    output = tmp_path / "output.mkv"
+    frames = render_section(
+        make_events(Fraction(0), Fraction(1)),
+        str(tmp_path),
+        str(output),
+        WIDTH,
+        HEIGHT,
+        Fraction(10),
+        Codec.H264,
+        Fraction(0),
+        Fraction(1),
+        "DEFAULT_PRESENTATION_POD",
+        None,
+    )
+
+    assert frames == 10
+    assert output.stat().st_size == frames * FRAME_BYTES
+
+
+def test_render_section_frame_count(tmp_path: Path, fake_ffmpeg: None) -> None:
+    output = tmp_path / "output.mkv"
+    frames = render_section(
+        make_events(Fraction(0), Fraction(2)),
+        str(tmp_path),
+        str(output),
+        WIDTH,
+        HEIGHT,
+        Fraction(10),
+        Codec.H264,
+        Fraction(7, 10),
+        Fraction(3, 2),
+        "DEFAULT_PRESENTATION_POD",
+        None,
+    )
+
+    # Frames 7 through 14
+    assert frames == 8
+    assert output.stat().st_size == frames * FRAME_BYTES
+
+
+def test_render_repeats_after_recording_starts(
+    tmp_path: Path, fake_ffmpeg: None
+) -> None:
+    # The first frame output must be a full frame even though the recording
+    # starts partway through, and the unchanged frames after it are repeats.
+    output = tmp_path / "output.mkv"
+    frames = render_section(
+        make_events(Fraction(1, 4), Fraction(1)),
+        str(tmp_path),
+        str(output),
+        WIDTH,
+        HEIGHT,
+        Fraction(4),
+        Codec.H264,
+        Fraction(0),
+        Fraction(1),
+        "DEFAULT_PRESENTATION_POD",
+        None,
+    )
+
+    assert frames == 3
+    data = output.read_bytes()
+    assert len(data) == frames * FRAME_BYTES
+    first_frame = data[:FRAME_BYTES]
+    for i in range(1, frames):
+        assert data[i * FRAME_BYTES : (i + 1) * FRAME_BYTES] == first_frame
@@ -0,0 +1,200 @@
+from fractions import Fraction
+from typing import Any, List, Tuple
+
+import cairo
+import pytest
+from packaging.version import Version
+
+from bbb_presentation_video.events import PresentationEvent
+from bbb_presentation_video.events.helpers import Position, Size
+from bbb_presentation_video.events.tldraw import AddShapeEvent, ShapeData
+from bbb_presentation_video.renderer.presentation import Transform
+from bbb_presentation_video.renderer.tldraw import TldrawRenderer
+
+PRESENTATION = "presentation"
+SLIDE = 0
+
+
+def make_renderer() -> TldrawRenderer[cairo.ImageSurface]:
+    surface = cairo.ImageSurface(cairo.FORMAT_RGB24, 64, 48)
+    transform = Transform(
+        padding=Size(0.0, 0.0),
+        scale=1.0,
+        size=Size(64.0, 48.0),
+        pos=Position(0.0, 0.0),
+        shapes_scale=1.0,
+        shapes_size=Size(64.0, 48.0),
+    )
+    renderer = TldrawRenderer(cairo.Context(surface), transform, Version("2.6.0"))
+    event: PresentationEvent = {
+        "name": "presentation",
+        "timestamp": Fraction(0),
+        "pod_id": "DEFAULT_PRESENTATION_POD",
+        "presentation": PRESENTATION,
+    }
+    renderer.presentation_event(event)
+    return renderer
+
+
+def add_shape(
+    renderer: TldrawRenderer[cairo.ImageSurface], id: str, data: ShapeData
+) -> None:
+    event: AddShapeEvent = {
+        "name": "tldraw.add_shape",
+        "id": id,
+        "presentation": PRESENTATION,
+        "slide": SLIDE,
+        "user_id": "user",
+        "data": data,
+    }
+    renderer.add_shape_event(event)
+
+
+def rectangle(childIndex: float, parentId: str = "page") -> ShapeData:
+    return {
+        "type": "rectangle",
+        "childIndex": childIndex,
+        "parentId": parentId,
+        "point": [8, 8],
+        "size": [16, 16],
+        "style": {"color": "black", "size": "small", "dash": "solid"},
+    }
+
+
+def sorted_ids(renderer: TldrawRenderer[cairo.ImageSurface]) -> List[str]:
+    shapes, _ = renderer.get_sorted_shapes(PRESENTATION, SLIDE)
+    return [id for id, _ in shapes]
+
+
+def test_shapes_sorted_by_child_index_then_id() -> None:
+    renderer = make_renderer()
+    add_shape(renderer, "c", rectangle(2))
+    add_shape(renderer, "b", rectangle(1))
+    add_shape(renderer, "a", rectangle(2))
+
+    assert sorted_ids(renderer) == ["b", "a", "c"]
+
+
+def test_sorted_shapes_updated_on_child_index_change() -> None:
+    renderer = make_renderer()
+    add_shape(renderer, "a", rectangle(1))
+    add_shape(renderer, "b", rectangle(2))
+    assert sorted_ids(renderer) == ["a", "b"]
+
+    add_shape(renderer, "a", {"childIndex": 3})
+    assert sorted_ids(renderer) == ["b", "a"]
+
+
+def test_sorted_shapes_updated_on_add_and_delete() -> None:
+    renderer = make_renderer()
+    add_shape(renderer, "a", rectangle(1))
+    assert sorted_ids(renderer) == ["a"]
+
+    add_shape(renderer, "b", rectangle(0))
+    assert sorted_ids(renderer) == ["b", "a"]
+
+    renderer.delete_shape_event(
+        {
+            "name": "tldraw.delete_shape",
+            "id": "b",
+            "presentation": PRESENTATION,
+            "slide": SLIDE,
+            "user_id": "user",
+        }
+    )
+    assert sorted_ids(renderer) == ["a"]
+
+
+def test_frame_map_updated_on_parent_change() -> None:
+    renderer = make_renderer()
+    add_shape(renderer, "frame", {**rectangle(1), "type": "frame"})
+    add_shape(renderer, "a", rectangle(2))
+
+    _, frame_map = renderer.get_sorted_shapes(PRESENTATION, SLIDE)
+    assert frame_map == {"frame": []}
+
+    add_shape(renderer, "a", {"parentId": "frame"})
+    _, frame_map = renderer.get_sorted_shapes(PRESENTATION, SLIDE)
+    assert [child.id for child in frame_map["frame"]] == ["a"]
+
+    add_shape(renderer, "a", {"parentId": "page"})
+    _, frame_map = renderer.get_sorted_shapes(PRESENTATION, SLIDE)
+    assert frame_map == {"frame": []}
+
+
+def test_frame_children_rendered_inside_frame(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    renderer = make_renderer()
+    add_shape(renderer, "frame", {**rectangle(1), "type": "frame"})
+    add_shape(renderer, "child", rectangle(2, parentId="frame"))
+    add_shape(renderer, "other", rectangle(3))
+
+    # Record the shapes finalized, along with the shapes they're drawn inside
+    calls: List[Tuple[str, List[str]]] = []
+    parents: List[str] = []
+    finalize_shapes = renderer.finalize_shapes
+
+    def spy(ctx: Any, id: str, shape: Any, frame_map: Any) -> None:
+        calls.append((id, list(parents)))
+        parents.append(id)
+        try:
+            finalize_shapes(ctx, id, shape, frame_map)
+        finally:
+            parents.pop()
+
+    monkeypatch.setattr(renderer, "finalize_shapes", spy)
+
+    assert renderer.finalize_frame(renderer.transform)
+    assert calls == [("frame", []), ("child", ["frame"]), ("other", [])]
+
+
+def draw(points: List[List[float]]) -> ShapeData:
+    return {
+        "type": "draw",
+        "childIndex": 1,
+        "parentId": "page",
+        "point": [8, 8],
+        "size": [16, 16],
+        "points": points,
+        "isComplete": True,
+        "style": {"color": "black", "size": "small", "dash": "draw"},
+    }
+
+
+def test_moved_shape_keeps_recording() -> None:
+    renderer = make_renderer()
+    points = [[0, 0, 0.5], [8, 4, 0.5], [16, 16, 0.5]]
+    add_shape(renderer, "a", draw(points))
+    assert renderer.finalize_frame(renderer.transform)
+    pattern = renderer.shape_patterns["a"]
+
+    # Updates may include the unchanged shape data along with the new position
+    add_shape(renderer, "a", {"point": [20, 20], "points": points})
+    assert renderer.shapes_changed
+    assert renderer.shape_patterns.get("a") is pattern
+
+    assert renderer.finalize_frame(renderer.transform)
+    assert renderer.shape_patterns["a"] is pattern
+
+
+def test_restyled_shape_drops_recording() -> None:
+    renderer = make_renderer()
+    add_shape(renderer, "a", draw([[0, 0, 0.5], [16, 16, 0.5]]))
+    assert renderer.finalize_frame(renderer.transform)
+    assert "a" in renderer.shape_patterns
+
+    add_shape(renderer, "a", {"style": {"color": "red"}})
+    assert renderer.shapes_changed
+    assert "a" not in renderer.shape_patterns
+
+
+def test_redrawn_shape_drops_recording() -> None:
+    renderer = make_renderer()
+    add_shape(renderer, "a", draw([[0, 0, 0.5], [16, 16, 0.5]]))
+    assert renderer.finalize_frame(renderer.transform)
+    assert "a" in renderer.shape_patterns
+
+    add_shape(renderer, "a", {"points": [[0, 0, 0.5], [16, 16, 0.5], [24, 8, 0.5]]})
+    assert renderer.shapes_changed
+    assert "a" not in renderer.shape_patterns